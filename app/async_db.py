@@ -0,0 +1,77 @@
+"""
+Accès asynchrone à la base, activé par ASYNC_DB=1.
+
+Les routes les plus sollicitées (scan, listes) existent alors en `async def`
+avec une AsyncSession : pendant l'attente de la base, la requête rend la main
+à la boucle d'événements au lieu d'occuper un thread du threadpool de
+Starlette (40 par défaut). Pilotes : aiosqlite pour SQLite, psycopg (async)
+pour PostgreSQL, à installer à part.
+"""
+import os
+
+from sqlalchemy.engine import make_url
+
+from app import db
+
+ASYNC_DB_ENABLED = os.getenv("ASYNC_DB", "0") == "1"
+
+
+def async_database_url(url: str) -> str:
+    """Même base, pilote asynchrone."""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend == "sqlite":
+        return parsed.set(drivername="sqlite+aiosqlite").render_as_string(hide_password=False)
+    if backend == "postgresql" and parsed.get_driver_name() in ("psycopg2", "psycopg"):
+        return parsed.set(drivername="postgresql+psycopg").render_as_string(hide_password=False)
+    return url
+
+
+def _create_async_engine(url: str, read_only: bool = False):
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    if make_url(url).get_backend_name() != "sqlite":
+        return create_async_engine(
+            async_database_url(url),
+            pool_size=db.DB_POOL_SIZE,
+            max_overflow=db.DB_MAX_OVERFLOW,
+            pool_pre_ping=db.DB_POOL_PRE_PING,
+            pool_recycle=db.DB_POOL_RECYCLE_SECONDS,
+        )
+    # même découpage que la version synchrone : une connexion d'écriture, un pool de lecture
+    pool_size = db.SQLITE_READ_POOL_SIZE if read_only else 1
+    engine = create_async_engine(
+        async_database_url(url),
+        connect_args={'timeout': db.SQLITE_BUSY_TIMEOUT_MS / 1000},
+        pool_size=pool_size,
+        max_overflow=pool_size if read_only else 0,
+        pool_timeout=60,
+    )
+    if db.DB_PROFILE != "legacy":
+        db.apply_sqlite_pragmas(engine.sync_engine, read_only)
+    return engine
+
+
+async_engine = None
+async_read_engine = None
+AsyncSessionLocal = None
+AsyncReadSessionLocal = None
+
+if ASYNC_DB_ENABLED:
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+
+    async_engine = _create_async_engine(db.DATABASE_URL)
+    async_read_engine = _create_async_engine(db.DATABASE_READ_URL or db.DATABASE_URL, read_only=True)
+    #expire_on_commit=False : on relit les valeurs après commit sans nouvel aller-retour (interdit en async)
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    AsyncReadSessionLocal = async_sessionmaker(async_read_engine, autoflush=False, expire_on_commit=False)
+
+
+async def get_async_db(): #équivalent asynchrone de get_db
+    async with AsyncSessionLocal() as session:
+        yield session
+
+
+async def get_async_read_db(): #équivalent asynchrone de get_read_db
+    async with AsyncReadSessionLocal() as session:
+        yield session
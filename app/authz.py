@@ -0,0 +1,194 @@
+"""
+Droits des utilisateurs sur les événements (table event_admins).
+
+Les rôles d'un utilisateur sur tous ses events sont lus en une requête, puis
+gardés pour la requête HTTP (request.state) et quelques secondes par processus
+(AUTHZ_CACHE_TTL_SECONDS). La dépendance est async : quand le cache répond,
+aucun thread ni session n'est pris. Toute écriture sur event_admins via l'ORM vide le
+cache de l'utilisateur concerné, au commit.
+
+Dans les routes :
+
+    current_user: CurrentUser = Depends(require_event_role("OWNER"))
+"""
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from fastapi import Depends, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, object_session
+
+from app import models
+from app.async_db import ASYNC_DB_ENABLED
+from app.db import session_scope
+from app.deps import CurrentUser, get_current_user
+
+# cache par processus, comme celui de deps.py : avec plusieurs workers, un rôle retiré
+# reste valable dans les autres workers jusqu'à AUTHZ_CACHE_TTL_SECONDS au plus
+AUTHZ_CACHE_TTL_SECONDS = float(os.getenv("AUTHZ_CACHE_TTL_SECONDS", "30"))
+
+# un rôle donne aussi les droits des rôles de rang inférieur
+ROLE_RANKS = {"SCANNER_ONLY": 1, "OWNER": 2}
+
+FORBIDDEN_DETAIL = "Accès refusé : admin de l'événement requis"
+
+_cache_lock = threading.Lock()
+_roles_cache: Dict[int, Tuple[Dict[int, str], float]] = {}
+
+
+def load_event_roles(user_id: int, db: Session) -> Dict[int, str]:
+    """event_id -> rôle, pour tous les events de l'utilisateur, en une requête."""
+    roles: Dict[int, str] = {}
+    rows = db.query(models.EventAdmin.event_id, models.EventAdmin.role).filter(
+        models.EventAdmin.user_id == user_id
+    )
+    for event_id, role in rows:
+        # doublon éventuel : on garde le rôle le plus fort
+        if ROLE_RANKS.get(role, 0) >= ROLE_RANKS.get(roles.get(event_id), 0):
+            roles[event_id] = role
+    return roles
+
+
+def invalidate_event_roles(user_id: Optional[int] = None) -> None:
+    with _cache_lock:
+        if user_id is None:
+            _roles_cache.clear()
+        else:
+            _roles_cache.pop(user_id, None)
+
+
+# utilisateurs dont les rôles ont changé dans la transaction en cours (session.info)
+_CHANGED_ROLES_KEY = "authz_changed_user_ids"
+
+
+@event.listens_for(models.EventAdmin, "after_insert")
+@event.listens_for(models.EventAdmin, "after_update")
+@event.listens_for(models.EventAdmin, "after_delete")
+def _remember_changed_roles(mapper, connection, target: models.EventAdmin) -> None:
+    # au flush les nouveaux rôles ne sont pas encore visibles des autres requêtes :
+    # vider le cache maintenant le laisserait se remplir avec les anciens
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault(_CHANGED_ROLES_KEY, set()).add(target.user_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_roles(session: Session) -> None:
+    for user_id in session.info.pop(_CHANGED_ROLES_KEY, ()):
+        invalidate_event_roles(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_changed_roles(session: Session) -> None:
+    session.info.pop(_CHANGED_ROLES_KEY, None)
+
+
+def _cached_roles(user_id: int, request: Optional[Request]) -> Optional[Dict[int, str]]:
+    if request is not None:
+        memo = getattr(request.state, "event_roles", None)
+        if memo is not None and memo[0] == user_id:
+            return memo[1]
+    with _cache_lock:
+        entry = _roles_cache.get(user_id)
+    if entry is not None and entry[1] > time.monotonic():
+        return entry[0]
+    return None
+
+
+def _remember_roles(user_id: int, roles: Dict[int, str], request: Optional[Request]) -> None:
+    with _cache_lock:
+        _roles_cache[user_id] = (roles, time.monotonic() + AUTHZ_CACHE_TTL_SECONDS)
+    if request is not None:
+        request.state.event_roles = (user_id, roles)
+
+
+def _load_event_roles_in_session(user_id: int) -> Dict[int, str]:
+    with session_scope(read_only=True) as db:
+        return load_event_roles(user_id, db)
+
+
+async def _load_event_roles_async(user_id: int) -> Dict[int, str]:
+    from app.async_db import AsyncReadSessionLocal
+
+    roles: Dict[int, str] = {}
+    async with AsyncReadSessionLocal() as db:
+        rows = await db.execute(
+            select(models.EventAdmin.event_id, models.EventAdmin.role).where(models.EventAdmin.user_id == user_id)
+        )
+        for event_id, role in rows:
+            if ROLE_RANKS.get(role, 0) >= ROLE_RANKS.get(roles.get(event_id), 0):
+                roles[event_id] = role
+    return roles
+
+
+async def get_event_roles_async(user_id: int, request: Optional[Request] = None) -> Dict[int, str]:
+    """Rôles de l'utilisateur par event, sans occuper de thread quand le cache répond."""
+    roles = _cached_roles(user_id, request)
+    if roles is None:
+        if ASYNC_DB_ENABLED:
+            roles = await _load_event_roles_async(user_id)
+        else:
+            roles = await run_in_threadpool(_load_event_roles_in_session, user_id)
+    _remember_roles(user_id, roles, request)
+    return roles
+
+
+def _role_allows(current: Optional[str], role: str) -> bool:
+    return current is not None and ROLE_RANKS.get(current, 0) >= ROLE_RANKS[role]
+
+
+async def check_event_role_async(
+    user: CurrentUser,
+    event_id: int,
+    role: str,
+    request: Optional[Request] = None,
+    detail: str = FORBIDDEN_DETAIL,
+) -> None:
+    if user.is_superadmin:
+        return
+    roles = await get_event_roles_async(user.id, request)
+    if not _role_allows(roles.get(event_id), role):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=detail)
+
+
+def _event_exists(event_id: int) -> bool:
+    with session_scope(read_only=True) as db:
+        return db.query(models.Event.id).filter(models.Event.id == event_id).first() is not None
+
+
+async def _event_exists_async(event_id: int) -> bool:
+    if not ASYNC_DB_ENABLED:
+        return await run_in_threadpool(_event_exists, event_id)
+
+    from app.async_db import AsyncReadSessionLocal
+
+    async with AsyncReadSessionLocal() as db:
+        return (await db.execute(select(models.Event.id).where(models.Event.id == event_id))).first() is not None
+
+
+def require_event_role(role: str, detail: str = FORBIDDEN_DETAIL):
+    """
+    Dépendance FastAPI : l'utilisateur doit avoir `role` (ou mieux) sur {event_id}.
+    Un événement inexistant donne 404 et non 403, comme avant : l'existence
+    n'est vérifiée qu'en cas de refus, l'accès autorisé ne coûte rien de plus.
+    """
+    if role not in ROLE_RANKS:
+        raise ValueError(f"unknown event role {role!r}")
+
+    async def dependency(
+        event_id: int,
+        request: Request,
+        current_user: CurrentUser = Depends(get_current_user),
+    ) -> CurrentUser:
+        try:
+            await check_event_role_async(current_user, event_id, role, request, detail)
+        except HTTPException:
+            if not await _event_exists_async(event_id):
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Event non trouvé")
+            raise
+        return current_user
+
+    return dependency
@@ -0,0 +1,268 @@
+"""
+Jeux de données synthétiques de grande taille (annuaire, événements, tickets).
+
+Tout est tiré d'une graine fixe : deux exécutions avec la même graine sur une
+base vide donnent les mêmes lignes. Les insertions sont ensemblistes (tables
+Core, executemany par paquets), si bien que 100k élèves et quelques
+événements de 10k participants se chargent en quelques secondes, sur la base
+configurée par DATABASE_URL.
+
+    python -m app.datagen --students 100000 --events 3 --participants 10000
+    python -m app.datagen --events 1 --participants 50000 --scanned 0.6 --seed 7
+"""
+import argparse
+import base64
+import random
+import time
+import unicodedata
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+from app import models
+from app.db import session_scope, upsert_insert
+from app.migrations import run_migrations
+from app.qr_tokens import SIGNED_TOKENS_ENABLED, generate_signed_token
+from app.security import hash_password
+from app.stats import rebuild_event_stats
+
+# lignes par INSERT envoyé à la base
+DATAGEN_CHUNK_SIZE = 5000
+
+FIRST_NAMES = (
+    "Adam", "Agathe", "Alexandre", "Alice", "Amélie", "Antoine", "Arthur", "Baptiste", "Camille", "Céline",
+    "Charlotte", "Chloé", "Clément", "Constance", "Damien", "Élise", "Émile", "Emma", "Erwann", "Étienne",
+    "Félix", "François", "Gabriel", "Hélène", "Hugo", "Inès", "Jade", "Jeanne", "Jules", "Juliette",
+    "Léa", "Léo", "Louis", "Louise", "Lucas", "Maël", "Manon", "Margaux", "Mathilde", "Maxime",
+    "Nathan", "Noémie", "Oscar", "Paul", "Pauline", "Pierre", "Raphaël", "Romane", "Sacha", "Thomas",
+)
+LAST_NAMES = (
+    "Martin", "Bernard", "Dubois", "Thomas", "Robert", "Richard", "Petit", "Durand", "Leroy", "Moreau",
+    "Simon", "Laurent", "Lefèvre", "Michel", "Garcia", "David", "Bertrand", "Roux", "Vincent", "Fournier",
+    "Morel", "Girard", "André", "Lefebvre", "Mercier", "Dupont", "Lambert", "Bonnet", "François", "Martinez",
+    "Legrand", "Garnier", "Faure", "Rousseau", "Blanc", "Guérin", "Muller", "Henry", "Roussel", "Nicolas",
+    "Perrin", "Morin", "Mathieu", "Clément", "Gauthier", "Dumont", "Lopez", "Fontaine", "Chevalier", "Robin",
+    "Gorin", "Cognet", "Le Gall", "Kerbrat", "Castel", "Besnard", "Ollivier", "Marchand", "Hamon", "Pichon",
+)
+EXTERNAL_DOMAINS = ("gmail.com", "yahoo.fr", "outlook.fr", "free.fr", "orange.fr")
+PROMOS = ("2024", "2025", "2026", "2027", "2028")
+TARIFS = ("cotisant", "non-cotisant", "externe", "staff")
+
+
+@dataclass
+class Dataset:
+    """Ce qui a été créé, pour les scripts qui s'en servent ensuite (bench...)."""
+
+    student_count: int = 0
+    event_ids: List[int] = field(default_factory=list)
+    admin_user_ids: List[int] = field(default_factory=list)
+    tickets_by_status: Dict[str, int] = field(default_factory=dict)
+
+
+def _ascii(value: str) -> str:
+    value = unicodedata.normalize("NFKD", value).encode("ascii", "ignore").decode("ascii")
+    return value.lower().replace(" ", "")
+
+
+def _random_token(rng: random.Random, event_id: int) -> str:
+    """Même format que qr_tokens.generate_qr_token, mais tiré de rng."""
+    raw = base64.urlsafe_b64encode(rng.getrandbits(128).to_bytes(16, "big")).rstrip(b"=").decode("ascii")
+    if SIGNED_TOKENS_ENABLED:
+        return generate_signed_token(event_id, token_id=raw[:12])
+    return raw
+
+
+def _insert_chunks(db: Session, statement, rows: List[dict]) -> list:
+    """executemany par paquets ; renvoie les lignes de RETURNING s'il y en a."""
+    returned = []
+    for start in range(0, len(rows), DATAGEN_CHUNK_SIZE):
+        result = db.execute(statement, rows[start:start + DATAGEN_CHUNK_SIZE])
+        if result.returns_rows:
+            returned.extend(result.all())
+    return returned
+
+
+def generate_students(db: Session, rng: random.Random, count: int, external_ratio: float = 0.1) -> int:
+    """count élèves (≈ external_ratio d'externes), emails uniques ; renvoie le nombre inséré."""
+    table = models.Student.__table__
+    rows = []
+    for i in range(count):
+        first_name = rng.choice(FIRST_NAMES)
+        last_name = rng.choice(LAST_NAMES)
+        local = f"{_ascii(first_name)}.{_ascii(last_name)}{i}"
+        external = rng.random() < external_ratio
+        rows.append(
+            {
+                "first_name": first_name,
+                "last_name": last_name.upper(),
+                "email": f"{local}@{rng.choice(EXTERNAL_DOMAINS) if external else 'eleves.enpc.fr'}",
+                "is_external": external,
+            }
+        )
+    # relancer le générateur sur une base déjà remplie ne casse rien
+    statement = upsert_insert(db, table).on_conflict_do_nothing(index_elements=["email"]).returning(table.c.id)
+    return len(_insert_chunks(db, statement, rows))
+
+
+def generate_admins(db: Session, rng: random.Random, count: int, password: str) -> List[int]:
+    """count utilisateurs admins d'événements ; un seul hachage bcrypt pour tous."""
+    table = models.User.__table__
+    hashed = hash_password(password)
+    suffix = rng.getrandbits(32)
+    rows = [
+        {
+            "email": f"admin{i}.{suffix:08x}@example.com",
+            "name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+            "hashed_password": hashed,
+            "is_superadmin": False,
+        }
+        for i in range(count)
+    ]
+    _insert_chunks(db, upsert_insert(db, table).on_conflict_do_nothing(index_elements=["email"]), rows)
+    emails = [row["email"] for row in rows]
+    ids = dict(db.execute(select(table.c.email, table.c.id).where(table.c.email.in_(emails))).all())
+    return [ids[email] for email in emails]
+
+
+def generate_event(
+    db: Session,
+    rng: random.Random,
+    participants: int,
+    admin_user_ids: List[int],
+    scanned_ratio: float = 0.3,
+    canceled_ratio: float = 0.02,
+    name: Optional[str] = None,
+) -> models.Event:
+    """Un événement, ses participants et leurs tickets dans des statuts mélangés."""
+    date = datetime(2026, 1, 1, 20, 0) + timedelta(days=rng.randint(0, 364))
+    event = models.Event(
+        name=name or f"Soirée {rng.choice(LAST_NAMES)} {date:%d/%m}",
+        description="Jeu de données généré (app.datagen)",
+        date=date,
+        location=rng.choice(("ENPC", "Champs-sur-Marne", "Paris")),
+    )
+    db.add(event)
+    db.flush()
+
+    if admin_user_ids:
+        db.execute(
+            insert(models.EventAdmin.__table__),
+            [
+                {"event_id": event.id, "user_id": user_id, "role": "OWNER" if position == 0 else "SCANNER_ONLY"}
+                for position, user_id in enumerate(admin_user_ids)
+            ],
+        )
+
+    participant_rows = []
+    for _ in range(participants):
+        first_name = rng.choice(FIRST_NAMES)
+        last_name = rng.choice(LAST_NAMES)
+        external = rng.random() < 0.1
+        participant_rows.append(
+            {
+                "event_id": event.id,
+                "first_name": first_name,
+                "last_name": last_name.upper(),
+                "promo": None if external else rng.choice(PROMOS),
+                "email": f"{_ascii(first_name)}.{_ascii(last_name)}{rng.getrandbits(24)}@"
+                + (rng.choice(EXTERNAL_DOMAINS) if external else "eleves.enpc.fr"),
+                "tarif": "externe" if external else rng.choice(TARIFS),
+                "qr_code": _random_token(rng, event.id),
+            }
+        )
+    table = models.Participant.__table__
+    returned = _insert_chunks(db, insert(table).returning(table.c.id, table.c.qr_code), participant_rows)
+    ids = {token: participant_id for participant_id, token in returned}
+
+    ticket_rows = []
+    for participant in participant_rows:  # ordre d'origine : mêmes statuts d'une exécution à l'autre
+        draw = rng.random()
+        if draw < scanned_ratio:
+            status = "SCANNED"
+            scanned_at = date + timedelta(seconds=rng.randint(0, 3 * 3600))  # arrivées sur 3 heures
+        elif draw < scanned_ratio + canceled_ratio:
+            status, scanned_at = "CANCELED", None
+        else:
+            status, scanned_at = "UNUSED", None
+        ticket_rows.append(
+            {
+                "event_id": event.id,
+                "participant_id": ids[participant["qr_code"]],
+                "user_email": participant["email"],
+                "user_name": f"{participant['first_name']} {participant['last_name']}",
+                "qr_code_token": participant["qr_code"],
+                "status": status,
+                "scanned_at": scanned_at,
+            }
+        )
+    _insert_chunks(db, insert(models.Ticket.__table__), ticket_rows)
+    return event
+
+
+def generate_dataset(
+    db: Session,
+    seed: int = 42,
+    students: int = 100000,
+    events: int = 3,
+    participants: int = 10000,
+    admins: int = 3,
+    scanned_ratio: float = 0.3,
+    canceled_ratio: float = 0.02,
+    admin_password: str = "changeme",
+) -> Dataset:
+    """Annuaire + événements complets, sans commit (à la charge de l'appelant)."""
+    rng = random.Random(seed)
+    dataset = Dataset()
+    dataset.student_count = generate_students(db, rng, students)
+    dataset.admin_user_ids = generate_admins(db, rng, admins, admin_password)
+    for _ in range(events):
+        event = generate_event(db, rng, participants, dataset.admin_user_ids, scanned_ratio, canceled_ratio)
+        dataset.event_ids.append(event.id)
+        rebuild_event_stats(db, event.id)
+
+    rows = db.execute(
+        select(models.Ticket.status).where(models.Ticket.event_id.in_(dataset.event_ids))
+    ).scalars()
+    for status in rows:
+        dataset.tickets_by_status[status] = dataset.tickets_by_status.get(status, 0) + 1
+    return dataset
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--students", type=int, default=100000)
+    parser.add_argument("--events", type=int, default=3)
+    parser.add_argument("--participants", type=int, default=10000, help="par événement")
+    parser.add_argument("--admins", type=int, default=3, help="admins par événement (le premier est OWNER)")
+    parser.add_argument("--scanned", type=float, default=0.3, help="part des tickets déjà scannés")
+    parser.add_argument("--canceled", type=float, default=0.02, help="part des tickets annulés")
+    parser.add_argument("--admin-password", default="changeme")
+    args = parser.parse_args()
+
+    run_migrations()
+    started = time.perf_counter()
+    with session_scope() as db:
+        dataset = generate_dataset(
+            db,
+            seed=args.seed,
+            students=args.students,
+            events=args.events,
+            participants=args.participants,
+            admins=args.admins,
+            scanned_ratio=args.scanned,
+            canceled_ratio=args.canceled,
+            admin_password=args.admin_password,
+        )
+        db.commit()
+    print(
+        f"{dataset.student_count} élèves, événements {dataset.event_ids}, tickets {dataset.tickets_by_status}"
+        f" en {time.perf_counter() - started:.1f} s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,132 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
 from fastapi import Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
 from jose import jwt, JWTError
 
-from app.db import get_db
+from app.async_db import ASYNC_DB_ENABLED
+from app.db import session_scope
 from app import models, schemas
 from app.security import ALGORITHM, SECRET_KEY
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login") #l'authentificatin se fait par un token qui vient de post /auth/login
 
+# cache token vérifié -> utilisateur, pour ne pas relire users à chaque requête.
+# Le cache est propre à chaque processus : une modification (désactivation,
+# perte du superadmin...) vide celui du processus qui l'écrit, mais les autres
+# workers uvicorn gardent l'ancienne copie jusqu'à AUTH_CACHE_TTL_SECONDS au plus.
+# Avec plusieurs workers, baisser ce TTL au retard toléré (0 = pas de cache).
+AUTH_CACHE_TTL_SECONDS = float(os.getenv("AUTH_CACHE_TTL_SECONDS", "60"))
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "1024"))
+
+
+class CurrentUser:
+    """Copie figée de l'utilisateur connecté, utilisable sans session db."""
+
+    __slots__ = ("id", "email", "name", "is_superadmin")
+
+    def __init__(self, id: int, email: str, name: Optional[str], is_superadmin: bool) -> None:
+        self.id = id
+        self.email = email
+        self.name = name
+        self.is_superadmin = bool(is_superadmin)
+
+
+_cache_lock = threading.Lock()
+_user_cache: "OrderedDict[str, Tuple[CurrentUser, float]]" = OrderedDict()
+
+
+def _cache_get(token: str) -> Optional[CurrentUser]:
+    with _cache_lock:
+        entry = _user_cache.get(token)
+        if entry is None:
+            return None
+        user, expires_at = entry
+        if expires_at <= time.time():
+            del _user_cache[token]
+            return None
+        _user_cache.move_to_end(token)
+        return user
+
+
+def _cache_put(token: str, user: CurrentUser, token_exp: Optional[float]) -> None:
+    expires_at = time.time() + AUTH_CACHE_TTL_SECONDS
+    if token_exp is not None:
+        expires_at = min(expires_at, token_exp)  # jamais au-delà de l'expiration du jwt
+    with _cache_lock:
+        _user_cache[token] = (user, expires_at)
+        _user_cache.move_to_end(token)
+        while len(_user_cache) > AUTH_CACHE_MAX_ENTRIES:
+            _user_cache.popitem(last=False)
+
+
+def invalidate_user(user_id: int) -> None:
+    """Oublie les tokens en cache d'un utilisateur (modifié ou supprimé), dans ce processus seulement."""
+    with _cache_lock:
+        for token in [token for token, (user, _) in _user_cache.items() if user.id == user_id]:
+            del _user_cache[token]
+
+
+# utilisateurs modifiés dans la transaction en cours (session.info)
+_CHANGED_USERS_KEY = "auth_changed_user_ids"
+
+
+@event.listens_for(models.User, "after_update")
+@event.listens_for(models.User, "after_delete")
+def _remember_changed_user(mapper, connection, target: models.User) -> None:
+    # vidé au commit seulement : au flush, une autre requête relirait encore l'ancienne ligne
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault(_CHANGED_USERS_KEY, set()).add(target.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_users(session: Session) -> None:
+    for user_id in session.info.pop(_CHANGED_USERS_KEY, ()):
+        invalidate_user(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_changed_users(session: Session) -> None:
+    session.info.pop(_CHANGED_USERS_KEY, None)
+
 
 def get_user_by_id(user_id: int, db: Session) -> models.User | None:
     return db.query(models.User).filter(models.User.id == user_id).first()
 
 
+def _load_user_snapshot(user_id: int) -> Optional[CurrentUser]:
+    with session_scope(read_only=True) as db:
+        user = get_user_by_id(user_id=user_id, db=db)
+        if user is None:
+            return None
+        return CurrentUser(user.id, user.email, user.name, user.is_superadmin)
+
+
+async def _load_user_snapshot_async(user_id: int) -> Optional[CurrentUser]:
+    from app.async_db import AsyncReadSessionLocal
+
+    async with AsyncReadSessionLocal() as db:
+        user = await db.get(models.User, user_id)
+        if user is None:
+            return None
+        return CurrentUser(user.id, user.email, user.name, user.is_superadmin)
+
+
 async def get_current_user(
     token: str = Depends(oauth2_scheme), #recupere le token depuis le header de la requete http
-    db: Session = Depends(get_db), #ouvre une session db
-) -> models.User:
+) -> CurrentUser:
+    user = _cache_get(token)
+    if user is not None:
+        return user #token déjà vérifié récemment : ni décodage ni requête
+
     credentials_exception = HTTPException( #erreur standard si le token est invalide
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -26,7 +135,7 @@ async def get_current_user(
 
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]) #decodage du jwt
-        raw_user_id = payload.get("sub") 
+        raw_user_id = payload.get("sub")
         if raw_user_id is None:
             raise credentials_exception
         try:
@@ -36,8 +145,13 @@ async def get_current_user(
     except JWTError:
         raise credentials_exception
 
-    user = get_user_by_id(user_id=user_id, db=db) #on récupère l'utilisateur
+    #session courte (async, ou dans un thread) : la route n'a pas besoin d'ouvrir la sienne
+    if ASYNC_DB_ENABLED:
+        user = await _load_user_snapshot_async(user_id)
+    else:
+        user = await run_in_threadpool(_load_user_snapshot, user_id)
     if user is None:
         raise credentials_exception
 
+    _cache_put(token, user, payload.get("exp"))
     return user #on renvoie l'utilisateur
@@ -1,16 +1,17 @@
 import logging
 import os
 import smtplib
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
 from email.mime.image import MIMEImage
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
-from io import BytesIO
-from typing import Optional
-
-import qrcode
+from typing import Iterator, List, Optional, Tuple
 
 from app import models
+from app.qr_cache import get_qr_png
 
 
 class EmailSettings:
@@ -22,6 +23,8 @@ class EmailSettings:
         password: str,
         from_email: str,
         from_name: str,
+        use_tls: bool = True,
+        max_connections: int = 2,
     ) -> None:
         self.host = host
         self.port = port
@@ -29,6 +32,8 @@ class EmailSettings:
         self.password = password
         self.from_email = from_email
         self.from_name = from_name
+        self.use_tls = use_tls
+        self.max_connections = max_connections
 
 
 def load_email_settings() -> Optional[EmailSettings]:
@@ -38,6 +43,8 @@ def load_email_settings() -> Optional[EmailSettings]:
     password = os.getenv("EMAIL_PASSWORD")
     from_email = os.getenv("EMAIL_FROM", username or "")
     from_name = os.getenv("EMAIL_FROM_NAME", "Events ENPC")
+    use_tls = os.getenv("EMAIL_USE_TLS", "1") == "1"
+    max_connections = int(os.getenv("EMAIL_MAX_CONNECTIONS", "2"))
 
     if not username or not password or not from_email:
         return None
@@ -49,42 +56,117 @@ def load_email_settings() -> Optional[EmailSettings]:
         password=password,
         from_email=from_email,
         from_name=from_name,
+        use_tls=use_tls,
+        max_connections=max_connections,
     )
 
 
+class SMTPConnectionPool:
+    """
+    Connexions SMTP authentifiées gardées ouvertes entre deux envois.
+    On évite ainsi un handshake TLS + login par mail ; le nombre de connexions
+    simultanées est plafonné (les fournisseurs limitent les connexions).
+    """
+
+    def __init__(
+        self,
+        settings: EmailSettings,
+        max_idle_seconds: float = 60.0,
+        timeout: float = 30.0,
+    ) -> None:
+        self.settings = settings
+        self.max_idle_seconds = max_idle_seconds
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max(1, settings.max_connections))
+        self._lock = threading.Lock()
+        self._idle: List[Tuple[smtplib.SMTP, float]] = []
+
+    def _connect(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(self.settings.host, self.settings.port, timeout=self.timeout)
+        try:
+            if self.settings.use_tls:
+                server.starttls()
+            server.login(self.settings.username, self.settings.password)
+        except Exception:
+            server.close()
+            raise
+        return server
+
+    def _take_idle(self) -> Optional[smtplib.SMTP]:
+        now = time.monotonic()
+        with self._lock:
+            while self._idle:
+                server, last_used = self._idle.pop()
+                if now - last_used < self.max_idle_seconds:
+                    return server
+                _quit_quietly(server)
+        return None
+
+    @contextmanager
+    def connection(self) -> Iterator[smtplib.SMTP]:
+        with self._slots:
+            server = self._take_idle() or self._connect()
+            try:
+                yield server
+            except Exception:
+                # connexion dans un état inconnu : on ne la remet pas dans le pool
+                _quit_quietly(server)
+                raise
+            with self._lock:
+                self._idle.append((server, time.monotonic()))
+
+    def send_message(self, msg: MIMEMultipart) -> None:
+        try:
+            with self.connection() as server:
+                server.send_message(msg)
+        except (smtplib.SMTPServerDisconnected, ConnectionError):
+            # connexion fermée par le serveur pendant qu'elle dormait : on réessaie une fois
+            with self.connection() as server:
+                server.send_message(msg)
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for server, _ in idle:
+            _quit_quietly(server)
+
+
+def _quit_quietly(server: smtplib.SMTP) -> None:
+    try:
+        server.quit()
+    except Exception:
+        server.close()
+
+
+_pool_lock = threading.Lock()
+_pool: Optional[SMTPConnectionPool] = None
+
+
+def get_smtp_pool(settings: EmailSettings) -> SMTPConnectionPool:
+    """Pool partagé du processus, recréé si la configuration change."""
+    global _pool
+    with _pool_lock:
+        if _pool is None or vars(_pool.settings) != vars(settings):
+            if _pool is not None:
+                _pool.close()
+            _pool = SMTPConnectionPool(settings)
+        return _pool
+
+
 def _format_event_date(value: datetime) -> str:
     return value.strftime("%d/%m/%Y %H:%M")
 
 
 def _build_qr_image_bytes(token: str) -> bytes:
-    qr = qrcode.QRCode(
-        version=1,
-        error_correction=qrcode.constants.ERROR_CORRECT_M,
-        box_size=8,
-        border=2,
-    )
-    qr.add_data(token)
-    qr.make(fit=True)
-    img = qr.make_image(fill_color="black", back_color="white")
-    buffer = BytesIO()
-    img.save(buffer, format="PNG")
-    return buffer.getvalue()
+    return get_qr_png(token)  #rendu une seule fois puis servi depuis le cache disque
 
 
-def send_participant_qr_email(
+def build_participant_qr_message(
+    settings: EmailSettings,
     event: models.Event,
     participant: models.Participant,
     qr_token: str,
-) -> None:
-    settings = load_email_settings()
-    if settings is None or not participant.email:
-        logging.warning(
-            "Email ignored (missing settings or participant email) event_id=%s participant_id=%s",
-            getattr(event, "id", None),
-            getattr(participant, "id", None),
-        )
-        return
-
+) -> MIMEMultipart:
     date_str = _format_event_date(event.date)
     full_name = f"{participant.first_name} {participant.last_name}".strip()
     subject = f"{event.name} - {date_str} - {full_name}"
@@ -126,18 +208,36 @@ def send_participant_qr_email(
     attachment.add_header("Content-Disposition", "attachment", filename="qr_code.png")
     msg.attach(attachment)
 
-    #envoie SMTP
+    return msg
+
+
+def send_participant_qr_email(
+    event: models.Event,
+    participant: models.Participant,
+    qr_token: str,
+) -> bool:
+    """Envoie le QR code au participant, renvoie True si le mail est parti."""
+    settings = load_email_settings()
+    if settings is None or not participant.email:
+        logging.warning(
+            "Email ignored (missing settings or participant email) event_id=%s participant_id=%s",
+            getattr(event, "id", None),
+            getattr(participant, "id", None),
+        )
+        return False
+
+    msg = build_participant_qr_message(settings, event, participant, qr_token)
+
+    #envoie SMTP (connexion réutilisée si possible)
     try:
-        with smtplib.SMTP(settings.host, settings.port) as server:
-            server.starttls()
-            server.login(settings.username, settings.password)
-            server.send_message(msg)
+        get_smtp_pool(settings).send_message(msg)
         logging.info(
             "Email sent event_id=%s participant_id=%s to=%s",
             getattr(event, "id", None),
             getattr(participant, "id", None),
             participant.email,
         )
+        return True
     except Exception as exc:
         logging.exception(
             "Email send failed event_id=%s participant_id=%s to=%s error=%s",
@@ -146,3 +246,4 @@ def send_participant_qr_email(
             participant.email,
             exc,
         )
+        return False
@@ -1,22 +1,10 @@
 import os
-from contextlib import contextmanager
 
-from sqlalchemy.orm import Session
-
-from .db import SessionLocal
+from .db import session_scope
 from . import models
 from .security import hash_password
 
 
-@contextmanager #creation d'une session sqlalchemy temporaire independante de fastapi
-def _session_scope():
-    db: Session = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
 def ensure_initial_superadmin() -> None:
     """
     Crée un compte superadmin s'il n'existe pas encore.
@@ -33,7 +21,7 @@ def ensure_initial_superadmin() -> None:
         # Si la configuration est vide, on ne tente rien.
         return
 
-    with _session_scope() as db:
+    with session_scope() as db:
         existing = db.query(models.User).filter(models.User.email == email).first()
         if existing:
             return
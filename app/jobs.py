@@ -0,0 +1,225 @@
+"""
+File de tâches persistante stockée dans la table jobs.
+
+L'API ne fait qu'enregistrer des tâches (enqueue, dans sa propre transaction) ;
+un worker (python -m app.worker, ou le thread lancé par main.py) les réclame
+par lots, les exécute et note le résultat. Une tâche en échec est reprogrammée
+avec un délai exponentiel jusqu'à max_attempts, puis passe en FAILED.
+"""
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.orm import Session
+
+from app import models
+from app.db import session_scope
+
+RETRY_BASE_SECONDS = 10
+RETRY_MAX_SECONDS = 15 * 60
+# tâche RUNNING depuis plus longtemps : son worker est mort, on la remet en file
+STALE_AFTER = timedelta(minutes=30)
+
+Handler = Callable[[Dict[str, Any]], None]
+
+_handlers: Dict[str, Handler] = {}
+_failure_handlers: Dict[str, Callable[[Dict[str, Any], str], None]] = {}
+
+
+def register(kind: str, on_failure: Optional[Callable[[Dict[str, Any], str], None]] = None):
+    """Décorateur qui associe une fonction (payload) -> None à un type de tâche."""
+    def decorator(func: Handler) -> Handler:
+        _handlers[kind] = func
+        if on_failure is not None:
+            _failure_handlers[kind] = on_failure
+        return func
+    return decorator
+
+
+def enqueue(
+    db: Session,
+    kind: str,
+    payload: Dict[str, Any],
+    max_attempts: int = 5,
+) -> models.Job:
+    """Ajoute la tâche à la session : elle part au commit de l'appelant."""
+    now = datetime.utcnow()
+    job = models.Job(
+        kind=kind,
+        payload=json.dumps(payload),
+        status="QUEUED",
+        attempts=0,
+        max_attempts=max_attempts,
+        run_after=now,
+        created_at=now,
+    )
+    db.add(job)
+    return job
+
+
+def enqueue_many(
+    db: Session,
+    kind: str,
+    payloads: List[Dict[str, Any]],
+    max_attempts: int = 5,
+) -> None:
+    """Comme enqueue, en un seul INSERT multi-lignes (imports en masse)."""
+    if not payloads:
+        return
+    now = datetime.utcnow()
+    db.execute(
+        insert(models.Job.__table__),
+        [
+            {
+                "kind": kind,
+                "payload": json.dumps(payload),
+                "status": "QUEUED",
+                "attempts": 0,
+                "max_attempts": max_attempts,
+                "run_after": now,
+                "created_at": now,
+            }
+            for payload in payloads
+        ],
+    )
+
+
+def _retry_delay(attempts: int) -> timedelta:
+    return timedelta(seconds=min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS))
+
+
+def claim_batch(worker_id: str, limit: int) -> List[models.Job]:
+    """Passe jusqu'à `limit` tâches prêtes en RUNNING, en une requête."""
+    now = datetime.utcnow()
+    with session_scope() as db:
+        ready = (
+            select(models.Job.id)
+            .where(models.Job.status == "QUEUED", models.Job.run_after <= now)
+            .order_by(models.Job.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)  # PostgreSQL : plusieurs workers sans se gêner (ignoré par SQLite)
+            .scalar_subquery()
+        )
+        jobs = db.scalars(
+            update(models.Job)
+            .where(models.Job.id.in_(ready), models.Job.status == "QUEUED")
+            .values(
+                status="RUNNING",
+                locked_by=worker_id,
+                locked_at=now,
+                attempts=models.Job.attempts + 1,
+            )
+            .returning(models.Job)
+            .execution_options(synchronize_session=False)
+        ).all()
+        # détachées avant le commit pour garder les valeurs lues
+        for job in jobs:
+            db.expunge(job)
+        db.commit()
+    return sorted(jobs, key=lambda job: job.id)
+
+
+def requeue_stale_jobs() -> int:
+    with session_scope() as db:
+        result = db.execute(
+            update(models.Job)
+            .where(
+                models.Job.status == "RUNNING",
+                models.Job.locked_at < datetime.utcnow() - STALE_AFTER,
+            )
+            .values(status="QUEUED", locked_by=None, locked_at=None)
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        return result.rowcount
+
+
+def _record_outcome(job: models.Job, error: Optional[str]) -> None:
+    now = datetime.utcnow()
+    values: Dict[str, Any] = {"locked_by": None, "locked_at": None, "last_error": error}
+    if error is None:
+        values.update(status="DONE", finished_at=now)
+    elif job.attempts < job.max_attempts:
+        values.update(status="QUEUED", run_after=now + _retry_delay(job.attempts))
+    else:
+        values.update(status="FAILED", finished_at=now)
+
+    with session_scope() as db:
+        db.execute(
+            update(models.Job)
+            .where(models.Job.id == job.id)
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+
+    if values["status"] == "FAILED" and job.kind in _failure_handlers:
+        try:
+            _failure_handlers[job.kind](json.loads(job.payload), error)
+        except Exception:
+            logging.exception("Job failure handler crashed job_id=%s kind=%s", job.id, job.kind)
+
+
+def run_job(job: models.Job) -> None:
+    handler = _handlers.get(job.kind)
+    try:
+        if handler is None:
+            raise LookupError(f"no handler for job kind {job.kind!r}")
+        handler(json.loads(job.payload))
+    except Exception as exc:
+        logging.exception("Job failed job_id=%s kind=%s attempt=%s", job.id, job.kind, job.attempts)
+        _record_outcome(job, f"{type(exc).__name__}: {exc}")
+    else:
+        _record_outcome(job, None)
+
+
+def run_worker(
+    concurrency: int = 4,
+    batch_size: int = 20,
+    poll_interval: float = 1.0,
+    stop: Optional[threading.Event] = None,
+    once: bool = False,
+) -> None:
+    """Boucle du worker : réclame un lot, l'exécute sur `concurrency` threads, recommence."""
+    stop = stop or threading.Event()
+    worker_id = f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+    last_recovery = 0.0
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="job") as executor:
+        while not stop.is_set():
+            try:
+                if time.monotonic() - last_recovery > 60:
+                    requeue_stale_jobs()
+                    last_recovery = time.monotonic()
+                jobs = claim_batch(worker_id, batch_size)
+            except Exception:
+                # DB indisponible ou verrouillée : on retentera au prochain tour
+                logging.exception("Job worker could not claim jobs")
+                stop.wait(poll_interval)
+                continue
+
+            if jobs:
+                list(executor.map(run_job, jobs))
+            elif once:
+                return
+            else:
+                stop.wait(poll_interval)
+
+
+def start_embedded_worker(stop: threading.Event, concurrency: int) -> threading.Thread:
+    """Worker dans un thread du processus API (mode dev, sans processus séparé)."""
+    thread = threading.Thread(
+        target=run_worker,
+        kwargs={"concurrency": concurrency, "stop": stop},
+        name="job-worker",
+        daemon=True,
+    )
+    thread.start()
+    return thread
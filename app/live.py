@@ -0,0 +1,266 @@
+"""
+Tableau de bord en direct des entrées d'un événement.
+
+Tant qu'au moins un tableau de bord est abonné à un événement, le hub garde
+en mémoire ses compteurs (scannés / restants, par tarif et par promo) et les
+met à jour à chaque scan réussi, sans relire la base. Chaque changement est
+sérialisé une seule fois puis déposé dans la file de chaque abonné : une
+dizaine de tableaux de bord ne coûte qu'un put_nowait chacun.
+
+Les routes de scan tournent souvent dans le threadpool : la publication passe
+par loop.call_soon_threadsafe vers la boucle de l'abonné.
+
+Le hub est propre au processus : il ne voit que les scans et les écritures
+servis par son worker uvicorn. Avec plusieurs workers, un tableau de bord ne
+suit en direct que ce qui passe par le sien ; il faut alors un seul worker
+(ou relire GET /events/{id}/stats) pour des compteurs exacts.
+
+Pendant un chargement des compteurs depuis la base, les changements publiés
+(scans, tickets ajoutés ou retirés) sont notés puis rejoués sur les compteurs
+chargés : un commit fait pendant la requête de chargement n'est pas perdu,
+qu'elle l'ait vu ou non (chaque changement est idempotent).
+"""
+import asyncio
+import threading
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from app import models
+from app.serializers import dumps
+
+# messages gardés par abonné ; au-delà, les plus anciens sont perdus (client trop lent)
+LIVE_QUEUE_SIZE = 256
+
+TicketKey = Tuple[Optional[str], Optional[str]]  # (tarif, promo)
+Change = Tuple[str, tuple]  # (méthode de EventCounters, arguments), rejoué après un chargement
+
+
+class _Bucket:
+    __slots__ = ("total", "scanned")
+
+    def __init__(self) -> None:
+        self.total = 0
+        self.scanned = 0
+
+
+class EventCounters:
+    """Compteurs d'un événement, tenus à jour ticket par ticket."""
+
+    def __init__(self) -> None:
+        self.tickets: Dict[int, Tuple[TicketKey, bool]] = {}  # ticket_id -> ((tarif, promo), scanné)
+        self.total = _Bucket()
+        self.by_tarif: Dict[Optional[str], _Bucket] = {}
+        self.by_promo: Dict[Optional[str], _Bucket] = {}
+
+    def _buckets(self, key: TicketKey) -> Iterable[_Bucket]:
+        tarif, promo = key
+        yield self.total
+        yield self.by_tarif.setdefault(tarif, _Bucket())
+        yield self.by_promo.setdefault(promo, _Bucket())
+
+    def add(self, ticket_id: int, key: TicketKey, scanned: bool) -> None:
+        self.remove(ticket_id)
+        self.tickets[ticket_id] = (key, scanned)
+        for bucket in self._buckets(key):
+            bucket.total += 1
+            bucket.scanned += scanned
+
+    def remove(self, ticket_id: int) -> None:
+        entry = self.tickets.pop(ticket_id, None)
+        if entry is None:
+            return
+        key, scanned = entry
+        for bucket in self._buckets(key):
+            bucket.total -= 1
+            bucket.scanned -= scanned
+
+    def mark_scanned(self, ticket_id: int) -> bool:
+        """False si le ticket est inconnu ou déjà compté."""
+        entry = self.tickets.get(ticket_id)
+        if entry is None or entry[1]:
+            return False
+        self.tickets[ticket_id] = (entry[0], True)
+        for bucket in self._buckets(entry[0]):
+            bucket.scanned += 1
+        return True
+
+    def replay(self, changes: Iterable[Change]) -> None:
+        for method, args in changes:
+            getattr(self, method)(*args)
+
+    def as_dict(self) -> Dict[str, Any]:
+        def bucket(b: _Bucket) -> Dict[str, int]:
+            return {"total": b.total, "scanned": b.scanned, "remaining": b.total - b.scanned}
+
+        return {
+            **bucket(self.total),
+            "by_tarif": {key: bucket(b) for key, b in self.by_tarif.items() if b.total},
+            "by_promo": {key: bucket(b) for key, b in self.by_promo.items() if b.total},
+        }
+
+
+def load_event_tickets(event_id: int, db: Session) -> List[Tuple[int, TicketKey, bool]]:
+    """(ticket_id, (tarif, promo), scanné) de tous les tickets de l'événement."""
+    rows = (
+        db.query(models.Ticket.id, models.Participant.tarif, models.Participant.promo, models.Ticket.status)
+        .outerjoin(models.Participant, models.Participant.id == models.Ticket.participant_id)
+        .filter(models.Ticket.event_id == event_id)
+    )
+    return [(ticket_id, (tarif, promo), status == "SCANNED") for ticket_id, tarif, promo, status in rows]
+
+
+def _offer(queue: "asyncio.Queue[bytes]", message: bytes) -> None:
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(message)
+
+
+class Subscription:
+    def __init__(self, event_id: int) -> None:
+        self.event_id = event_id
+        self.loop = asyncio.get_running_loop()
+        self.queue: "asyncio.Queue[bytes]" = asyncio.Queue(maxsize=LIVE_QUEUE_SIZE)
+
+
+class LiveHub:
+    """Abonnés et compteurs des événements suivis en direct."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counters: Dict[int, EventCounters] = {}
+        self._subscribers: Dict[int, Set[Subscription]] = {}
+        self._loads: Dict[int, int] = {}  # chargements en cours par événement
+        self._pending: Dict[int, List[Change]] = {}  # changements arrivés pendant ces chargements
+
+    def is_tracked(self, event_id: int) -> bool:
+        return event_id in self._subscribers
+
+    def subscribe(self, event_id: int) -> Tuple[Subscription, bool]:
+        """
+        Nouvel abonné ; True s'il faut charger les compteurs : l'appelant lit
+        alors les tickets (après cet appel) et les passe à load_counters.
+        """
+        subscription = Subscription(event_id)
+        with self._lock:
+            subscribers = self._subscribers.setdefault(event_id, set())
+            subscribers.add(subscription)
+            must_load = event_id not in self._counters and event_id not in self._loads
+            if must_load:
+                self._begin_load(event_id)
+        return subscription, must_load
+
+    def _begin_load(self, event_id: int) -> None:
+        # à partir d'ici, les changements sont notés pour être rejoués par load_counters
+        self._loads[event_id] = self._loads.get(event_id, 0) + 1
+        self._pending.setdefault(event_id, [])
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.event_id)
+            if subscribers is None:
+                return
+            subscribers.discard(subscription)
+            if not subscribers:
+                # plus personne ne regarde : on libère la mémoire de l'événement
+                del self._subscribers[subscription.event_id]
+                self._counters.pop(subscription.event_id, None)
+                self._loads.pop(subscription.event_id, None)
+                self._pending.pop(subscription.event_id, None)
+
+    def load_counters(self, event_id: int, tickets: List[Tuple[int, TicketKey, bool]]) -> None:
+        counters = EventCounters()
+        for ticket_id, key, scanned in tickets:
+            counters.add(ticket_id, key, scanned)
+        with self._lock:
+            if event_id not in self._subscribers or event_id not in self._loads:
+                return
+            counters.replay(self._pending[event_id])
+            self._loads[event_id] -= 1
+            if not self._loads[event_id]:
+                # plus aucun chargement en cours : plus rien à rejouer
+                del self._loads[event_id]
+                del self._pending[event_id]
+            self._counters[event_id] = counters
+        self._publish(event_id, {"type": "counters", "event_id": event_id, "counters": counters.as_dict()})
+
+    def snapshot(self, event_id: int) -> Optional[bytes]:
+        with self._lock:
+            counters = self._counters.get(event_id)
+            if counters is None:
+                return None
+            return dumps({"type": "counters", "event_id": event_id, "counters": counters.as_dict()})
+
+    def ticket_scanned(
+        self,
+        event_id: int,
+        ticket_id: int,
+        user_name: Optional[str] = None,
+        scanned_at: Optional[datetime] = None,
+    ) -> None:
+        """À appeler après le commit d'un scan réussi."""
+        if not self.is_tracked(event_id):
+            return
+        with self._lock:
+            counters = self._record(event_id, ("mark_scanned", (ticket_id,)))
+            if counters is None or not counters.mark_scanned(ticket_id):
+                return
+            message = {
+                "type": "scan",
+                "event_id": event_id,
+                "ticket_id": ticket_id,
+                "user_name": user_name,
+                "scanned_at": scanned_at,
+                "counters": counters.as_dict(),
+            }
+        self._publish(event_id, message)
+
+    def tickets_changed(
+        self,
+        event_id: int,
+        added: Iterable[Tuple[int, TicketKey, bool]] = (),
+        removed: Iterable[int] = (),
+    ) -> None:
+        """À appeler après le commit d'un ajout / suppression / changement de tarif ou promo."""
+        if not self.is_tracked(event_id):
+            return
+        changes = [("remove", (ticket_id,)) for ticket_id in removed]
+        changes += [("add", ticket) for ticket in added]
+        with self._lock:
+            for change in changes:
+                self._record(event_id, change)
+            counters = self._counters.get(event_id)
+            if counters is None:
+                return  # chargement en cours : rejoué par load_counters
+            counters.replay(changes)
+            message = {"type": "counters", "event_id": event_id, "counters": counters.as_dict()}
+        self._publish(event_id, message)
+
+    def reload(self, event_id: int, db: Session) -> None:
+        """Recharge les compteurs depuis la base (changements en masse)."""
+        with self._lock:
+            if event_id not in self._subscribers:
+                return
+            self._begin_load(event_id)
+        self.load_counters(event_id, load_event_tickets(event_id, db))
+
+    def _record(self, event_id: int, change: Change) -> Optional[EventCounters]:
+        """Note le changement si un chargement est en cours ; compteurs actuels (verrou tenu)."""
+        pending = self._pending.get(event_id)
+        if pending is not None:
+            pending.append(change)
+        return self._counters.get(event_id)
+
+    def _publish(self, event_id: int, message: Dict[str, Any]) -> None:
+        payload = dumps(message)  # une seule sérialisation pour tous les abonnés
+        with self._lock:
+            subscribers = list(self._subscribers.get(event_id, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(_offer, subscription.queue, payload)
+            except RuntimeError:
+                pass  # boucle fermée (arrêt du serveur)
+
+
+live_hub = LiveHub()
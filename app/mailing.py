@@ -0,0 +1,179 @@
+"""
+Envoi des QR codes par mail via la file de tâches (app/jobs.py).
+
+Un mailing d'événement est une tâche "mail_event" qui crée une tâche
+"send_participant_email" par participant à servir ; la concurrence est celle
+du worker (EMAIL_WORKERS). La progression est tenue à jour dans la table
+mailings par chaque envoi, le mailing passe en DONE au dernier.
+"""
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from app import jobs, models
+from app.db import session_scope
+from app.email_utils import load_email_settings, send_participant_qr_email
+from app.qr_cache import prerender_event
+
+SEND_EMAIL_JOB = "send_participant_email"
+MAIL_EVENT_JOB = "mail_event"
+
+
+def enqueue_participant_email(
+    db: Session,
+    participant_id: int,
+    mailing_id: Optional[int] = None,
+) -> models.Job:
+    """Programme l'envoi du QR code ; part au commit de l'appelant."""
+    return jobs.enqueue(db, SEND_EMAIL_JOB, {"participant_id": participant_id, "mailing_id": mailing_id})
+
+
+def enqueue_participant_emails(db: Session, participant_ids: List[int]) -> None:
+    jobs.enqueue_many(
+        db,
+        SEND_EMAIL_JOB,
+        [{"participant_id": participant_id, "mailing_id": None} for participant_id in participant_ids],
+    )
+
+
+def start_mailing(db: Session, event_id: int, force: bool = False) -> models.Mailing:
+    """
+    Crée et programme le mailing, ou renvoie celui déjà en cours pour l'event,
+    quel que soit son force : à l'appelant de vérifier qu'il correspond.
+    """
+    current = (
+        db.query(models.Mailing)
+        .filter(
+            models.Mailing.event_id == event_id,
+            models.Mailing.status.in_(("QUEUED", "RUNNING")),
+        )
+        .first()
+    )
+    if current is not None:
+        return current
+
+    mailing = models.Mailing(
+        event_id=event_id,
+        status="QUEUED",
+        force=force,
+        total=0,
+        sent=0,
+        failed=0,
+        skipped=0,
+        created_at=datetime.utcnow(),
+    )
+    db.add(mailing)
+    db.flush()
+    jobs.enqueue(db, MAIL_EVENT_JOB, {"mailing_id": mailing.id})
+    db.commit()
+    db.refresh(mailing)
+    return mailing
+
+
+def _count_progress(db: Session, mailing_id: Optional[int], column: str) -> None:
+    if mailing_id is None:
+        return
+    table = models.Mailing
+    counter = getattr(table, column)
+    db.execute(
+        update(table)
+        .where(table.id == mailing_id)
+        .values({counter: counter + 1})
+        .execution_options(synchronize_session=False)
+    )
+    db.execute(
+        update(table)
+        .where(
+            table.id == mailing_id,
+            table.status == "RUNNING",
+            table.sent + table.failed + table.skipped >= table.total,
+        )
+        .values(status="DONE", finished_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+
+
+@jobs.register(MAIL_EVENT_JOB)
+def _prepare_mailing(payload: Dict[str, Any]) -> None:
+    with session_scope() as db:
+        mailing = db.get(models.Mailing, payload["mailing_id"])
+        if mailing is None or mailing.status != "QUEUED":
+            return
+        event_id = mailing.event_id
+
+    # rendu des PNG sur tous les cœurs avant les envois, qui liront le cache
+    try:
+        prerender_event(event_id)
+    except Exception:
+        logging.exception("QR prerender failed mailing_id=%s", payload["mailing_id"])
+
+    with session_scope() as db:
+        mailing = db.get(models.Mailing, payload["mailing_id"])
+
+        participant_ids = [
+            participant_id
+            for (participant_id,) in db.query(models.Participant.id)
+            .filter(
+                models.Participant.event_id == mailing.event_id,
+                models.Participant.email.isnot(None),
+                models.Participant.email != "",
+            )
+            .order_by(models.Participant.id)
+        ]
+        delivered = set()
+        if not mailing.force:
+            delivered = {
+                participant_id
+                for (participant_id,) in db.query(models.EmailDelivery.participant_id)
+                .join(models.Participant, models.Participant.id == models.EmailDelivery.participant_id)
+                .filter(models.Participant.event_id == mailing.event_id)
+            }
+        to_send = [pid for pid in participant_ids if pid not in delivered]
+
+        jobs.enqueue_many(
+            db,
+            SEND_EMAIL_JOB,
+            [{"participant_id": participant_id, "mailing_id": mailing.id} for participant_id in to_send],
+        )
+
+        mailing.total = len(participant_ids)
+        mailing.skipped = len(participant_ids) - len(to_send)
+        mailing.status = "RUNNING" if to_send else "DONE"
+        if not to_send:
+            mailing.finished_at = datetime.utcnow()
+        db.commit()
+
+
+def _count_failed_send(payload: Dict[str, Any], error: str) -> None:
+    # dernier essai raté : compte comme échec dans le mailing
+    with session_scope() as db:
+        _count_progress(db, payload.get("mailing_id"), "failed")
+        db.commit()
+
+
+@jobs.register(SEND_EMAIL_JOB, on_failure=_count_failed_send)
+def _send_participant_email(payload: Dict[str, Any]) -> None:
+    mailing_id = payload.get("mailing_id")
+
+    with session_scope() as db:
+        participant = db.get(models.Participant, payload["participant_id"])
+        event = db.get(models.Event, participant.event_id) if participant else None
+    # session fermée : pas de transaction ouverte pendant l'envoi SMTP
+
+    if participant is None or not participant.email or load_email_settings() is None:
+        # participant supprimé entre temps ou envoi impossible : rien à réessayer
+        with session_scope() as db:
+            _count_progress(db, mailing_id, "skipped")
+            db.commit()
+        return
+
+    if not send_participant_qr_email(event, participant, participant.qr_code):
+        raise RuntimeError("SMTP send failed")
+
+    with session_scope() as db:
+        db.merge(models.EmailDelivery(participant_id=participant.id, sent_at=datetime.utcnow()))
+        _count_progress(db, mailing_id, "sent")
+        db.commit()
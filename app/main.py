@@ -1,18 +1,41 @@
+import os
+import threading
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware 
 
-from .routers import auth, events, tickets, scan, admin, students, participants
-from .db import Base, engine
+from .routers import auth, events, tickets, scan, admin, students, participants, live
+from .db import engine
+from .migrations import run_migrations
+from .student_search import detect_search_index
 from .initial_superadmin import ensure_initial_superadmin
+from .jobs import start_embedded_worker
+from .worker import EMAIL_WORKERS
+
+# Création des tables et migrations du schéma au démarrage (cf. python -m app.migrations)
+run_migrations(engine)
 
-# Création des tables au démarrage
-Base.metadata.create_all(bind=engine)
+#recherche d'élèves par FTS5 si la table existe
+detect_search_index(engine)
 
 #garantit qu'au moins un admin existe (si nouvelle db)
 ensure_initial_superadmin() 
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    #l'API ne fait qu'enfiler les tâches, exécutées par python -m app.worker ;
+    #JOBS_EMBEDDED_WORKER=1 (dev seulement) les fait tourner dans un thread de l'API
+    stop = threading.Event()
+    if os.getenv("JOBS_EMBEDDED_WORKER", "0") == "1":
+        start_embedded_worker(stop, concurrency=EMAIL_WORKERS)
+    yield
+    stop.set()
+
+
 #création de l'app centrale
-app = FastAPI(title="TD-LOG API", version="0.1.0")
+app = FastAPI(title="TD-LOG API", version="0.1.0", lifespan=lifespan)
 
 #route de base Quand on lance le backend
 @app.get("/")
@@ -31,6 +54,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],   
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],  # curseur de pagination lisible par le front
 )
 
 #branchement des routes
@@ -41,3 +65,4 @@ app.include_router(scan.router)
 app.include_router(admin.router)
 app.include_router(students.router)
 app.include_router(participants.router)
+app.include_router(live.router)
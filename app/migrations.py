@@ -0,0 +1,146 @@
+"""
+Migrations du schéma, numérotées et appliquées une seule fois.
+
+create_all crée les tables manquantes mais ne modifie jamais une table
+existante (index, colonnes...) : ces changements passent par une migration
+ci-dessous, notée dans la table schema_version une fois appliquée. Chaque
+migration est idempotente (IF NOT EXISTS) pour pouvoir tourner au démarrage
+de plusieurs processus à la fois.
+
+    python -m app.migrations            # applique les migrations en attente
+    python -m app.migrations status     # version courante et migrations en attente
+"""
+import argparse
+import logging
+from datetime import datetime
+from typing import Callable, List, Optional, Set, Tuple
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import IntegrityError
+
+from app import models  # noqa: F401  (déclare les tables pour create_all)
+from app.db import Base, engine as default_engine
+from app.stats import rebuild_event_stats
+from app.student_search import install_search_index, install_trigram_index
+
+Migration = Tuple[int, str, Callable[[Connection], None]]
+
+
+def _hot_path_indexes(conn: Connection) -> None:
+    # colonnes filtrées par les routes (tickets d'un event, droits, tri des listes)
+    for statement in (
+        "CREATE INDEX IF NOT EXISTS ix_tickets_event_id_status ON tickets (event_id, status)",
+        "CREATE INDEX IF NOT EXISTS ix_event_admins_event_id_user_id ON event_admins (event_id, user_id)",
+        "CREATE INDEX IF NOT EXISTS ix_event_admins_user_id ON event_admins (user_id)",
+        "CREATE INDEX IF NOT EXISTS ix_events_date ON events (date)",
+        "CREATE INDEX IF NOT EXISTS ix_students_last_name ON students (last_name)",
+    ):
+        conn.execute(text(statement))
+
+
+def _students_search_index(conn: Connection) -> None:
+    if not install_search_index(conn):
+        logging.warning("FTS5 unavailable, student search falls back to ILIKE")
+
+
+def _students_trigram_index(conn: Connection) -> None:
+    if not install_trigram_index(conn):
+        logging.warning("FTS5 trigram tokenizer unavailable, substring search falls back to ILIKE")
+
+
+def _ticket_participant_id(conn: Connection) -> None:
+    # tickets.participant_id remplace la jointure sur qr_code = qr_code_token
+    if "participant_id" not in {column["name"] for column in inspect(conn).get_columns("tickets")}:
+        conn.execute(text("ALTER TABLE tickets ADD COLUMN participant_id INTEGER REFERENCES participants (id)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_tickets_participant_id ON tickets (participant_id)"))
+    conn.execute(
+        text(
+            "UPDATE tickets SET participant_id = ("
+            " SELECT participants.id FROM participants WHERE participants.qr_code = tickets.qr_code_token)"
+            " WHERE participant_id IS NULL"
+        )
+    )
+
+
+def _event_stats(conn: Connection) -> None:
+    # la table est créée par create_all, on la remplit depuis les tickets existants
+    rebuild_event_stats(conn)
+
+
+def _event_stats_without_total(conn: Connection) -> None:
+    # le total se déduit des lignes "tarif" (voir app/stats.py) : l'ancienne ligne n'est plus tenue à jour
+    conn.execute(text("DELETE FROM event_stats WHERE dimension = 'total'"))
+
+
+MIGRATIONS: List[Migration] = [
+    (1, "hot path indexes", _hot_path_indexes),
+    (2, "students full-text search", _students_search_index),
+    (3, "tickets.participant_id", _ticket_participant_id),
+    (4, "event stats", _event_stats),
+    (5, "students substring search", _students_trigram_index),
+    (6, "event stats without total row", _event_stats_without_total),
+]
+
+
+def _ensure_version_table(conn: Connection) -> None:
+    conn.execute(
+        text(
+            "CREATE TABLE IF NOT EXISTS schema_version ("
+            " version INTEGER PRIMARY KEY,"
+            " name VARCHAR NOT NULL,"
+            " applied_at TIMESTAMP NOT NULL)"
+        )
+    )
+
+
+def applied_versions(conn: Connection) -> Set[int]:
+    return {version for (version,) in conn.execute(text("SELECT version FROM schema_version"))}
+
+
+def run_migrations(engine: Optional[Engine] = None) -> List[int]:
+    """Crée les tables manquantes puis applique les migrations en attente."""
+    engine = engine or default_engine
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        _ensure_version_table(conn)
+
+    applied = []
+    for version, name, migrate in MIGRATIONS:
+        try:
+            with engine.begin() as conn:
+                if version in applied_versions(conn):
+                    continue
+                migrate(conn)
+                conn.execute(
+                    text("INSERT INTO schema_version (version, name, applied_at) VALUES (:version, :name, :now)"),
+                    {"version": version, "name": name, "now": datetime.utcnow()},
+                )
+        except IntegrityError:
+            # appliquée au même moment par un autre processus
+            continue
+        logging.info("Applied migration %s (%s)", version, name)
+        applied.append(version)
+    return applied
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Migrations du schéma de la base.")
+    parser.add_argument("command", nargs="?", choices=("upgrade", "status"), default="upgrade")
+    args = parser.parse_args()
+
+    if args.command == "upgrade":
+        applied = run_migrations()
+        print(f"{len(applied)} migration(s) appliquée(s)" + (f" : {applied}" if applied else ""))
+        return
+
+    with default_engine.begin() as conn:
+        _ensure_version_table(conn)
+        done = applied_versions(conn)
+    print(f"version : {max(done, default=0)}")
+    for version, name, _ in MIGRATIONS:
+        print(f"  {version:3} {'ok' if version in done else 'en attente'}  {name}")
+
+
+if __name__ == "__main__":
+    main()
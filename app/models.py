@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Index, Text
 from sqlalchemy.orm import relationship
 from .db import Base
 
@@ -15,7 +15,7 @@ class Event(Base):
     id = Column(Integer, primary_key=True)
     name = Column(String)
     description = Column(String)
-    date = Column(DateTime)
+    date = Column(DateTime, index=True)
     location = Column(String)
     created_by_id = Column(Integer, ForeignKey('users.id'))
     created_by = relationship('User')
@@ -27,6 +27,11 @@ class EventAdmin(Base): #table de liaisons un event peut avoir plusieurs admins
     user_id = Column(Integer, ForeignKey('users.id'))
     role = Column(String)
 
+    __table_args__ = (
+        Index("ix_event_admins_event_id_user_id", "event_id", "user_id"), #droit d'un user sur un event
+        Index("ix_event_admins_user_id", "user_id"), #tous les rôles d'un user (app/authz.py)
+    )
+
 class Ticket(Base):
     __tablename__ = 'tickets'
     id = Column(Integer, primary_key=True)
@@ -36,13 +41,33 @@ class Ticket(Base):
     qr_code_token = Column(String, unique=True, index=True)
     status = Column(String, default='UNUSED')
     scanned_at = Column(DateTime)
+    participant_id = Column(Integer, ForeignKey('participants.id'), nullable=True) #None pour les tickets créés sans participant
+    participant = relationship('Participant', back_populates='ticket')
+
+    __table_args__ = (
+        Index("ix_tickets_event_id_status", "event_id", "status"), #tickets d'un event, par statut
+        Index("ix_tickets_participant_id", "participant_id"), #ticket d'un participant (jointure des listes)
+    )
+
+class EventTicketVersion(Base): #compteur incrémenté à chaque changement des tickets d'un event hors scans (cache du snapshot hors-ligne)
+    __tablename__ = 'event_ticket_versions'
+    event_id = Column(Integer, ForeignKey('events.id'), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+class EventStat(Base): #compteurs précalculés d'un event (voir app/stats.py), mis à jour dans la transaction des écritures
+    __tablename__ = 'event_stats'
+    event_id = Column(Integer, ForeignKey('events.id'), primary_key=True)
+    dimension = Column(String, primary_key=True) # tarif / promo / arrival (total = somme des tarifs)
+    key = Column(String, primary_key=True, default='') #valeur du tarif / de la promo, début du créneau pour arrival ; '' si vide
+    registered = Column(Integer, nullable=False, default=0)
+    scanned = Column(Integer, nullable=False, default=0)
 
 class Student(Base): #annuaire
     __tablename__ = "students"
 
     id = Column(Integer, primary_key=True, index=True)
     first_name = Column(String, nullable=False)
-    last_name = Column(String, nullable=False)
+    last_name = Column(String, nullable=False, index=True)
     email = Column(String, unique=True, index=True, nullable=False)
     is_external = Column(Boolean, default=False)
 
@@ -59,3 +84,44 @@ class Participant(Base): #participants d'un évènement
     tarif = Column(String, nullable=True)
     qr_code = Column(String, unique=True, index=True, nullable=False)
     event = relationship("Event", backref="participants") #permet de faire event.participants et participant.event
+    ticket = relationship("Ticket", back_populates="participant", uselist=False) #participant.ticket
+
+
+class Mailing(Base): #envoi groupé des QR codes de tous les participants d'un event
+    __tablename__ = "mailings"
+
+    id = Column(Integer, primary_key=True, index=True)
+    event_id = Column(Integer, ForeignKey("events.id"), nullable=False, index=True)
+    status = Column(String, nullable=False, default="QUEUED") # QUEUED / RUNNING / DONE / FAILED
+    force = Column(Boolean, default=False) #renvoyer aussi aux participants déjà servis
+    total = Column(Integer, nullable=False, default=0)
+    sent = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+    skipped = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+
+class EmailDelivery(Base): #dernier envoi réussi du QR code à un participant
+    __tablename__ = "email_deliveries"
+
+    participant_id = Column(Integer, ForeignKey("participants.id"), primary_key=True)
+    sent_at = Column(DateTime, nullable=False)
+
+
+class Job(Base): #tâche persistante exécutée par le worker (voir app/jobs.py)
+    __tablename__ = "jobs"
+    __table_args__ = (Index("ix_jobs_status_run_after", "status", "run_after"),)
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)
+    payload = Column(Text, nullable=False, default="{}") #json
+    status = Column(String, nullable=False, default="QUEUED") # QUEUED / RUNNING / DONE / FAILED
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=5)
+    run_after = Column(DateTime, nullable=False)
+    locked_by = Column(String)
+    locked_at = Column(DateTime)
+    last_error = Column(Text)
+    created_at = Column(DateTime)
+    finished_at = Column(DateTime)
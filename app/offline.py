@@ -0,0 +1,99 @@
+"""
+Snapshot hors-ligne des tickets d'un événement pour les scanners.
+
+Format binaire (big-endian) :
+    en-tête  : magic b"TDLS", format (u8), event_id (u32), version (u64), nombre (u32)
+    entrées  : nombre x [sha256(token)[:8] (8 octets), statut (u8)], triées par empreinte
+Statuts : 0 = UNUSED, 1 = SCANNED, 2 = autre (ex: CANCELED).
+La version change à chaque changement des tickets (voir get_ticket_version).
+Le téléphone hashe le QR code lu et fait une recherche dichotomique.
+"""
+import hashlib
+import struct
+import threading
+from typing import Dict, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app import models
+from app.db import upsert_insert
+
+SNAPSHOT_MAGIC = b"TDLS"
+SNAPSHOT_FORMAT = 1
+DIGEST_SIZE = 8
+
+_HEADER = struct.Struct(">4sBIQI")
+_STATUS_CODES = {"UNUSED": 0, "SCANNED": 1}
+
+_cache_lock = threading.Lock()
+_cache: Dict[int, Tuple[int, bytes]] = {}  # event_id -> (version, snapshot)
+
+
+def token_digest(token: str) -> bytes:
+    return hashlib.sha256(token.encode("utf-8")).digest()[:DIGEST_SIZE]
+
+
+def bump_ticket_version(db: Session, event_id: int) -> None:
+    """
+    À appeler dans la transaction de toute écriture sur les tickets de l'event
+    (ajout, suppression...), sauf les scans : ils sont comptés à part.
+    """
+    table = models.EventTicketVersion.__table__
+    db.execute(
+        upsert_insert(db, table)
+        .values(event_id=event_id, version=1)
+        .on_conflict_do_update(
+            index_elements=[table.c.event_id],
+            set_={"version": table.c.version + 1},
+        )
+    )
+
+
+def get_ticket_version(db: Session, event_id: int) -> int:
+    """
+    Compteur de event_ticket_versions dans les bits hauts, nombre de tickets
+    scannés dans les bits bas. Un scan fait seulement passer son ticket à
+    SCANNED, sans écrire dans une ligne partagée par toutes les portes de
+    l'événement, et change quand même la version (le nombre ne fait que croître
+    entre deux incréments).
+    """
+    bumps = (
+        db.query(models.EventTicketVersion.version)
+        .filter(models.EventTicketVersion.event_id == event_id)
+        .scalar()
+    )
+    scanned = (
+        db.query(func.count(models.Ticket.id))
+        .filter(models.Ticket.event_id == event_id, models.Ticket.status == "SCANNED")
+        .scalar()
+    )  # index (event_id, status)
+    return ((bumps or 0) << 32) | scanned
+
+
+def build_snapshot(db: Session, event_id: int, version: int) -> bytes:
+    rows = (
+        db.query(models.Ticket.qr_code_token, models.Ticket.status)
+        .filter(models.Ticket.event_id == event_id)
+        .all()
+    )
+    entries = sorted(
+        token_digest(token) + bytes((_STATUS_CODES.get(status, 2),))
+        for token, status in rows
+    )
+    header = _HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_FORMAT, event_id, version, len(entries))
+    return header + b"".join(entries)
+
+
+def get_snapshot(db: Session, event_id: int) -> Tuple[int, bytes]:
+    """Renvoie (version, snapshot), depuis le cache si les tickets n'ont pas bougé."""
+    version = get_ticket_version(db, event_id)
+    with _cache_lock:
+        cached = _cache.get(event_id)
+    if cached is not None and cached[0] == version:
+        return cached
+
+    snapshot = build_snapshot(db, event_id, version)
+    with _cache_lock:
+        _cache[event_id] = (version, snapshot)
+    return version, snapshot
@@ -0,0 +1,161 @@
+"""
+Pagination par curseur (keyset) et export en flux pour les listes.
+
+Chaque liste est triée sur une clé stable qui finit par l'id. Le curseur
+renvoyé dans l'en-tête X-Next-Cursor encode la clé de la dernière ligne ;
+la page suivante repart de `WHERE (clé) > (curseur)`, sans OFFSET, donc à
+coût constant quelle que soit la profondeur. Le corps reste une liste JSON :
+sans `limit`, on renvoie tout comme avant.
+
+Avec `format=ndjson`, une ligne JSON par élément. Sans `limit`, les lignes
+sont lues par paquets (yield_per) et écrites au fil de l'eau, sans construire
+la liste ni de modèles Pydantic. Avec `limit`, la page (MAX_PAGE_SIZE lignes
+au plus) est lue d'un coup comme en JSON, pour connaître X-Next-Cursor avant
+d'envoyer les en-têtes. Dans les deux formats les tuples sont encodés
+directement (app/serializers.py).
+"""
+import base64
+import json
+from typing import Any, AsyncIterator, Iterator, List, Optional, Sequence, Type
+
+from fastapi import HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from sqlalchemy import Select, tuple_
+from sqlalchemy.orm import Session
+
+from app.db import session_scope
+from app.serializers import dumps, row_projector
+
+MAX_PAGE_SIZE = 1000
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+STREAM_BATCH_SIZE = 500
+
+
+class PageParams:
+    """Paramètres communs des listes."""
+
+    def __init__(self, limit: Optional[int], after: Optional[str], format: Optional[str]) -> None:
+        self.limit = limit
+        self.after = after
+        self.format = format or "json"
+
+
+async def page_params(
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Taille de page"),
+    after: Optional[str] = Query(None, description="Curseur X-Next-Cursor de la page précédente"),
+    format: Optional[str] = Query(None, pattern="^(json|ndjson)$", description="ndjson : flux ligne à ligne"),
+) -> PageParams:
+    """Dépendance des routes de liste (async : pas de passage par le threadpool)."""
+    return PageParams(limit, after, format)
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    raw = json.dumps(list(values), separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except ValueError:
+        values = None
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(status_code=400, detail="Curseur invalide")
+    return values
+
+
+def keyset(statement: Select, sort_columns: Sequence[Any], after: Optional[str]) -> Select:
+    """Trie sur la clé et repart après le curseur s'il y en a un."""
+    if after:
+        values = decode_cursor(after, len(sort_columns))
+        statement = statement.where(tuple_(*sort_columns) > tuple_(*values))
+    return statement.order_by(*sort_columns)
+
+
+def _stream_ndjson(statement: Select, schema: Optional[Type[BaseModel]]) -> Iterator[bytes]:
+    # session propre au flux : celle de la requête est fermée quand on écrit le corps
+    with session_scope(read_only=True) as db:
+        result = db.execute(statement.execution_options(yield_per=STREAM_BATCH_SIZE))
+        project = row_projector(list(result.keys()), schema)
+        for rows in result.partitions():
+            yield b"".join(dumps(project(row)) + b"\n" for row in rows)
+
+
+def paginate(
+    db: Session,
+    statement: Select,
+    sort_columns: Sequence[Any],
+    page: PageParams,
+    schema: Optional[Type[BaseModel]] = None,
+) -> Response:
+    """
+    Exécute une requête de colonnes (select(Model.a, Model.b, ...)) page par page
+    et renvoie directement le JSON (ou le flux NDJSON) au format de `schema`.
+    """
+    statement = keyset(statement, sort_columns, page.after)
+
+    if page.format == "ndjson" and page.limit is None:
+        return StreamingResponse(_stream_ndjson(statement, schema), media_type="application/x-ndjson")
+
+    if page.limit is not None:
+        statement = statement.limit(page.limit + 1)
+    result = db.execute(statement)
+    return _page(list(result.keys()), result.all(), sort_columns, page, schema)
+
+
+def _page(
+    columns: List[str],
+    rows: Sequence[Any],
+    sort_columns: Sequence[Any],
+    page: PageParams,
+    schema: Optional[Type[BaseModel]],
+) -> Response:
+    headers = {}
+    if page.limit is not None and len(rows) > page.limit:
+        rows = rows[: page.limit]
+        last = rows[-1]
+        headers[NEXT_CURSOR_HEADER] = encode_cursor([last[columns.index(column.key)] for column in sort_columns])
+
+    project = row_projector(columns, schema)
+    if page.format == "ndjson":
+        return Response(
+            content=b"".join(dumps(project(row)) + b"\n" for row in rows),
+            media_type="application/x-ndjson",
+            headers=headers,
+        )
+    return Response(
+        content=dumps([project(row) for row in rows]),
+        media_type="application/json",
+        headers=headers,
+    )
+
+
+async def _stream_ndjson_async(statement: Select, schema: Optional[Type[BaseModel]]) -> AsyncIterator[bytes]:
+    from app.async_db import AsyncReadSessionLocal
+
+    async with AsyncReadSessionLocal() as db:
+        result = await db.stream(statement.execution_options(yield_per=STREAM_BATCH_SIZE))
+        project = row_projector(list(result.keys()), schema)
+        async for rows in result.partitions():
+            yield b"".join(dumps(project(row)) + b"\n" for row in rows)
+
+
+async def paginate_async(
+    db,
+    statement: Select,
+    sort_columns: Sequence[Any],
+    page: PageParams,
+    schema: Optional[Type[BaseModel]] = None,
+) -> Response:
+    """Comme paginate, avec une AsyncSession (ASYNC_DB=1)."""
+    statement = keyset(statement, sort_columns, page.after)
+
+    if page.format == "ndjson" and page.limit is None:
+        return StreamingResponse(_stream_ndjson_async(statement, schema), media_type="application/x-ndjson")
+
+    if page.limit is not None:
+        statement = statement.limit(page.limit + 1)
+    result = await db.execute(statement)
+    return _page(list(result.keys()), result.all(), sort_columns, page, schema)
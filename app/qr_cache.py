@@ -0,0 +1,182 @@
+"""
+Cache disque des PNG de QR codes.
+
+Les images sont adressées par le contenu : sha256(paramètres de rendu + token).
+Un renvoi de mail ne coûte donc aucun rendu, et changer les paramètres
+invalide naturellement l'ancien cache. La taille totale est bornée
+(QR_CACHE_MAX_BYTES), les fichiers les moins récemment utilisés partent en premier.
+
+Pré-rendu de tout un événement sur tous les cœurs :
+
+    python -m app.qr_cache prerender <event_id> [--processes N]
+"""
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from typing import List, Optional, Tuple
+
+import qrcode
+
+QR_CACHE_DIR = os.getenv("QR_CACHE_DIR", "./qr_cache")
+QR_CACHE_MAX_BYTES = int(os.getenv("QR_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+
+QR_RENDER_PARAMS = {
+    "version": 1,
+    "error_correction": "M",
+    "box_size": 8,
+    "border": 2,
+    "fill_color": "black",
+    "back_color": "white",
+}
+_PARAMS_KEY = json.dumps(QR_RENDER_PARAMS, sort_keys=True)
+
+_lock = threading.Lock()
+_total_bytes: Optional[int] = None  # calculé au premier accès
+
+
+def render_qr_png(token: str) -> bytes:
+    qr = qrcode.QRCode(
+        version=QR_RENDER_PARAMS["version"],
+        error_correction=qrcode.constants.ERROR_CORRECT_M,
+        box_size=QR_RENDER_PARAMS["box_size"],
+        border=QR_RENDER_PARAMS["border"],
+    )
+    qr.add_data(token)
+    qr.make(fit=True)
+    img = qr.make_image(
+        fill_color=QR_RENDER_PARAMS["fill_color"],
+        back_color=QR_RENDER_PARAMS["back_color"],
+    )
+    buffer = BytesIO()
+    img.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _cache_path(token: str) -> str:
+    key = hashlib.sha256(f"{_PARAMS_KEY}\n{token}".encode("utf-8")).hexdigest()
+    return os.path.join(QR_CACHE_DIR, key[:2], f"{key}.png")
+
+
+def _cached_files() -> List[Tuple[str, float, int]]:
+    """(chemin, mtime, taille) des PNG en cache, lus une fois chacun."""
+    files = []
+    try:
+        subs = [sub.path for sub in os.scandir(QR_CACHE_DIR) if sub.is_dir()]
+    except FileNotFoundError:
+        return []
+    for sub in subs:
+        try:
+            entries = [entry for entry in os.scandir(sub) if entry.name.endswith(".png")]
+        except OSError:
+            continue
+        for entry in entries:
+            try:
+                stat = entry.stat()
+            except OSError:
+                # supprimé entre-temps (autre worker, nettoyage manuel...) : on l'ignore
+                continue
+            files.append((entry.path, stat.st_mtime, stat.st_size))
+    return files
+
+
+def _evict_if_needed() -> None:
+    """Supprime les moins récemment utilisés jusqu'à 90 % du plafond."""
+    global _total_bytes
+    if _total_bytes <= QR_CACHE_MAX_BYTES:
+        return
+    files = sorted(_cached_files(), key=lambda file: file[1])
+    total = sum(size for _, _, size in files)
+    target = QR_CACHE_MAX_BYTES * 0.9
+    for path, _, size in files:
+        if total <= target:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass  # déjà supprimé par un autre processus : sa place est libérée quand même
+        except OSError:
+            continue
+        total -= size
+    _total_bytes = total
+
+
+def _store(path: str, png: bytes) -> None:
+    global _total_bytes
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(png)
+    os.replace(tmp_path, path)  # écriture atomique : pas de PNG tronqué en cas de course
+
+    with _lock:
+        if _total_bytes is None:
+            _total_bytes = sum(size for _, _, size in _cached_files())
+        else:
+            _total_bytes += len(png)
+        _evict_if_needed()
+
+
+def get_qr_png(token: str) -> bytes:
+    """PNG du QR code, rendu seulement s'il n'est pas déjà en cache."""
+    path = _cache_path(token)
+    try:
+        with open(path, "rb") as f:
+            png = f.read()
+        os.utime(path)  # marque l'utilisation pour l'éviction
+        return png
+    except FileNotFoundError:
+        pass
+
+    png = render_qr_png(token)
+    try:
+        _store(path, png)
+    except OSError:
+        # cache indisponible (disque plein, droits...) : on sert quand même l'image
+        pass
+    return png
+
+
+def prerender_event(event_id: int, processes: Optional[int] = None) -> int:
+    """Rend en parallèle les QR codes manquants des participants de l'event."""
+    from app import models
+    from app.db import session_scope
+
+    with session_scope() as db:
+        tokens = [
+            token
+            for (token,) in db.query(models.Participant.qr_code)
+            .filter(models.Participant.event_id == event_id)
+        ]
+    missing = [token for token in tokens if not os.path.exists(_cache_path(token))]
+    if not missing:
+        return 0
+
+    # spawn : on peut être appelé depuis un thread (worker de tâches), fork y est risqué
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=processes or os.cpu_count(), mp_context=context) as executor:
+        pngs = executor.map(render_qr_png, missing, chunksize=64)
+        for token, png in zip(missing, pngs):
+            _store(_cache_path(token), png)
+    return len(missing)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Cache des images de QR codes.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    prerender = commands.add_parser("prerender", help="pré-rend les QR codes d'un event")
+    prerender.add_argument("event_id", type=int)
+    prerender.add_argument("--processes", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.command == "prerender":
+        count = prerender_event(args.event_id, processes=args.processes)
+        print(f"{count} QR codes rendus")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Génération des tokens mis dans les QR codes.
+
+Deux formats coexistent :
+    - aléatoire (historique) : token_urlsafe(16), sans point
+    - signé : "<event_id>.<id ticket>.<signature>", signature = HMAC-SHA256
+      tronqué sur "<event_id>.<id ticket>" avec une clé dérivée de SECRET_KEY.
+L'id de ticket du format signé est un identifiant aléatoire et non la clé
+primaire : le token est créé avant l'insertion du ticket en base.
+Un token signé invalide ou d'un autre événement est refusé sans requête SQL.
+"""
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+from typing import Optional
+
+from app.security import SECRET_KEY
+
+# QR_SIGNED_TOKENS=1 pour émettre des tokens signés (les anciens restent valides)
+SIGNED_TOKENS_ENABLED = os.getenv("QR_SIGNED_TOKENS", "0") == "1"
+
+_SIGNATURE_SIZE = 12
+_SIGNING_KEY = hmac.new(SECRET_KEY.encode("utf-8"), b"qr-token-v1", hashlib.sha256).digest()
+
+
+def _sign(message: str) -> str:
+    digest = hmac.new(_SIGNING_KEY, message.encode("utf-8"), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest[:_SIGNATURE_SIZE]).decode("ascii")
+
+
+def generate_random_token() -> str:
+    return secrets.token_urlsafe(16)
+
+
+def generate_signed_token(event_id: int, token_id: Optional[str] = None) -> str:
+    """token_id : identifiant imposé (jeux de données reproductibles), aléatoire sinon."""
+    message = f"{event_id}.{token_id or secrets.token_urlsafe(9)}"
+    return f"{message}.{_sign(message)}"
+
+
+def generate_qr_token(event_id: int) -> str:
+    """Token à mettre dans le QR code d'un nouveau ticket de l'événement."""
+    if SIGNED_TOKENS_ENABLED:
+        return generate_signed_token(event_id)
+    return generate_random_token()
+
+
+def is_signed_token(token: str) -> bool:
+    return token.count(".") == 2
+
+
+def signed_token_event_id(token: str) -> Optional[int]:
+    """Event du token signé, ou None si la signature ne correspond pas."""
+    message, _, signature = token.rpartition(".")
+    if not hmac.compare_digest(_sign(message).encode("ascii"), signature.encode("utf-8")):
+        return None
+    try:
+        return int(message.split(".", 1)[0])
+    except ValueError:
+        return None
@@ -1,37 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 
-from app.db import get_db
+from app.db import get_db, get_read_db
 from app import models, schemas
-from app.deps import get_current_user
+from app.authz import require_event_role
+from app.deps import CurrentUser
 
 router = APIRouter(prefix="/events/{event_id}/admins", tags=["admins"])
 
-
-def _check_user_can_manage_event(
-    event: models.Event,
-    current_user: models.User,
-    db: Session,
-):
-    # superadmin = full power
-    if current_user.is_superadmin:
-        return
-
-    # est-ce que current_user est OWNER de l'event ?
-    rel = (
-        db.query(models.EventAdmin)
-        .filter(
-            models.EventAdmin.event_id == event.id,
-            models.EventAdmin.user_id == current_user.id,
-            models.EventAdmin.role == "OWNER",
-        )
-        .first()
-    )
-    if rel is None:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Tu n'es pas owner de cet event",
-        )
+OWNER_DETAIL = "Tu n'es pas owner de cet event"
 
 
 @router.post("/")
@@ -39,7 +16,7 @@ def add_admin_to_event(
     event_id: int,
     body: dict,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(require_event_role("OWNER", OWNER_DETAIL)),
 ):
     """
     body attendu :
@@ -58,8 +35,6 @@ def add_admin_to_event(
     if not event:
         raise HTTPException(status_code=404, detail="Event non trouvé")
 
-    _check_user_can_manage_event(event, current_user, db)
-
     user = db.query(models.User).filter(models.User.email == user_email).first()
     if not user:
         raise HTTPException(status_code=404, detail="Utilisateur non trouvé")
@@ -96,15 +71,13 @@ def add_admin_to_event(
 @router.get("/")
 def list_event_admins(
     event_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_read_db),
+    current_user: CurrentUser = Depends(require_event_role("OWNER", OWNER_DETAIL)),
 ):
     event = db.query(models.Event).filter(models.Event.id == event_id).first()
     if not event:
         raise HTTPException(status_code=404, detail="Event non trouvé")
 
-    _check_user_can_manage_event(event, current_user, db)
-
     rels = (
         db.query(models.EventAdmin)
         .filter(models.EventAdmin.event_id == event_id)
@@ -5,7 +5,7 @@ from sqlalchemy.orm import Session
 from app.db import get_db
 from app import models, schemas
 from app.security import hash_password, verify_password, create_access_token
-from app.deps import get_current_user
+from app.deps import CurrentUser, get_current_user
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
@@ -53,5 +53,5 @@ def login(
 
 
 @router.get("/me", response_model=schemas.UserOut)
-def read_me(current_user: models.User = Depends(get_current_user)):
+def read_me(current_user: CurrentUser = Depends(get_current_user)):
     return current_user
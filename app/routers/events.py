@@ -1,43 +1,23 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from app.db import get_db
-from app import models, schemas
-from app.deps import get_current_user
+from app.async_db import ASYNC_DB_ENABLED, get_async_read_db
+from app.db import get_db, get_read_db
+from app import models, schemas, stats
+from app.authz import require_event_role
+from app.deps import CurrentUser, get_current_user
+from app.pagination import PageParams, page_params, paginate, paginate_async
 
 router = APIRouter(prefix="/events", tags=["events"])
 
 
-def _check_user_is_event_owner(
-    event_id: int,
-    current_user: models.User,
-    db: Session,
-):
-    """Authorize only superadmins or event owners (role OWNER)."""
-    if current_user.is_superadmin:
-        return
-
-    rel = (
-        db.query(models.EventAdmin)
-        .filter(
-          models.EventAdmin.event_id == event_id,
-          models.EventAdmin.user_id == current_user.id,
-          models.EventAdmin.role == "OWNER",
-        )
-        .first()
-    )
-    if rel is None:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Accès refusé : admin de l'événement requis",
-        )
-
-
 @router.post("/", response_model=schemas.EventOut)
 def create_event(
     event_in: schemas.EventCreate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
     event = models.Event(
         name=event_in.name,
@@ -62,32 +42,64 @@ def create_event(
     return event
 
 
-@router.get("/", response_model=list[schemas.EventOut])
-def list_events(db: Session = Depends(get_db)):
-    events = db.query(models.Event).all()
-    return events
+_EVENT_LIST_COLUMNS = (
+    models.Event.id,
+    models.Event.name,
+    models.Event.description,
+    models.Event.date,
+    models.Event.location,
+)
+
+
+def list_events(
+    page: PageParams = Depends(page_params),
+    db: Session = Depends(get_read_db),
+):
+    statement = select(*_EVENT_LIST_COLUMNS)
+    return paginate(db, statement, (models.Event.id,), page, schemas.EventOut)
+
+
+async def list_events_async(
+    page: PageParams = Depends(page_params),
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    statement = select(*_EVENT_LIST_COLUMNS)
+    return await paginate_async(db, statement, (models.Event.id,), page, schemas.EventOut)
+
+
+router.get("/", response_model=list[schemas.EventOut])(list_events_async if ASYNC_DB_ENABLED else list_events)
 
 
 @router.get("/{event_id}", response_model=schemas.EventOut)
-def get_event(event_id: int, db: Session = Depends(get_db)):
+def get_event(event_id: int, db: Session = Depends(get_read_db)):
     event = db.query(models.Event).filter(models.Event.id == event_id).first()
     if not event:
         raise HTTPException(status_code=404, detail="Event non trouvé")
     return event
 
 
+#compteurs précalculés (table event_stats) : quelques lignes lues, quelle que soit la taille de l'event
+@router.get("/{event_id}/stats", response_model=schemas.EventStatsOut)
+def get_event_stats(
+    event_id: int,
+    db: Session = Depends(get_read_db),
+    current_user: CurrentUser = Depends(require_event_role("OWNER")),
+):
+    if db.get(models.Event, event_id) is None:
+        raise HTTPException(status_code=404, detail="Event non trouvé")
+    return stats.get_event_stats(db, event_id)
+
+
 @router.delete("/{event_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_event(
     event_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(require_event_role("OWNER")),
 ):
     event = db.query(models.Event).filter(models.Event.id == event_id).first()
     if not event:
         raise HTTPException(status_code=404, detail="Event non trouvé")
 
-    _check_user_is_event_owner(event_id, current_user, db)
-
     db.delete(event)
     db.commit()
 
@@ -97,14 +109,12 @@ def update_event(
     event_id: int,
     event_in: schemas.EventCreate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(require_event_role("OWNER")),
 ):
     event = db.query(models.Event).filter(models.Event.id == event_id).first()
     if not event:
         raise HTTPException(status_code=404, detail="Event non trouvé")
 
-    _check_user_is_event_owner(event_id, current_user, db)
-
     event.name = event_in.name
     event.description = event_in.description
     event.date = event_in.date
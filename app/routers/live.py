@@ -0,0 +1,125 @@
+import asyncio
+from typing import List, Optional, Tuple
+
+from fastapi import APIRouter, Depends, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+
+from app import models
+from app.authz import check_event_role_async, require_event_role
+from app.db import session_scope
+from app.deps import CurrentUser, get_current_user
+from app.live import Subscription, live_hub, load_event_tickets
+
+router = APIRouter(prefix="/events/{event_id}/live", tags=["live"])
+
+# commentaire SSE envoyé quand rien ne se passe, pour garder la connexion ouverte
+SSE_KEEPALIVE_SECONDS = 15
+
+
+def _event_exists(event_id: int) -> bool:
+    with session_scope(read_only=True) as db:
+        return db.get(models.Event, event_id) is not None
+
+
+def _open_event(event_id: int, must_load: bool) -> Tuple[bool, Optional[List]]:
+    with session_scope(read_only=True) as db:
+        if db.get(models.Event, event_id) is None:
+            return False, None
+        return True, load_event_tickets(event_id, db) if must_load else None
+
+
+async def _subscribe(event_id: int) -> Subscription:
+    """Abonne au hub ; charge les compteurs si personne ne suivait encore l'événement."""
+    subscription, must_load = live_hub.subscribe(event_id)
+    try:
+        exists, tickets = await run_in_threadpool(_open_event, event_id, must_load)
+        if not exists:
+            raise HTTPException(status_code=404, detail="Event non trouvé")
+    except BaseException:
+        live_hub.unsubscribe(subscription)
+        raise
+    if must_load:
+        live_hub.load_counters(event_id, tickets)  # publie les compteurs à tous les abonnés
+    else:
+        snapshot = live_hub.snapshot(event_id)
+        if snapshot is not None:
+            subscription.queue.put_nowait(snapshot)
+    return subscription
+
+
+#flux SSE (text/event-stream) : un message "data: {...}" par scan ou changement de compteurs
+@router.get("/stream")
+async def stream_event_live(
+    event_id: int,
+    request: Request,
+    current_user: CurrentUser = Depends(require_event_role("OWNER")),
+):
+    if not await run_in_threadpool(_event_exists, event_id):
+        raise HTTPException(status_code=404, detail="Event non trouvé")
+
+    async def events():
+        # abonnement pris dans le générateur : un client parti avant le début du
+        # flux n'y entre jamais, et n'a donc rien à désabonner
+        subscription = None
+        try:
+            subscription = await _subscribe(event_id)
+            while True:
+                try:
+                    message = await asyncio.wait_for(subscription.queue.get(), SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    yield b": keepalive\n\n"
+                    continue
+                yield b"data: " + message + b"\n\n"
+        except HTTPException:
+            return  # événement supprimé entre-temps
+        finally:
+            if subscription is not None:
+                live_hub.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+#même flux en WebSocket ; le navigateur ne peut pas y mettre d'en-tête : token en paramètre ?token=
+@router.websocket("/ws")
+async def websocket_event_live(websocket: WebSocket, event_id: int, token: Optional[str] = None):
+    if token is None:
+        authorization = websocket.headers.get("authorization", "")
+        token = authorization[7:] if authorization.lower().startswith("bearer ") else None
+    try:
+        if token is None:
+            raise HTTPException(status_code=401, detail="Not authenticated")
+        current_user = await get_current_user(token)
+        await check_event_role_async(current_user, event_id, "OWNER")
+        subscription = await _subscribe(event_id)
+    except HTTPException as exc:
+        await websocket.close(code=1008, reason=str(exc.detail))
+        return
+
+    async def send() -> None:
+        while True:
+            await websocket.send_text((await subscription.queue.get()).decode("utf-8"))
+
+    async def receive() -> None:
+        # le client n'envoie rien d'utile, on attend juste sa déconnexion
+        try:
+            while True:
+                await websocket.receive_text()
+        except WebSocketDisconnect:
+            return
+
+    tasks = []
+    try:
+        await websocket.accept()
+        tasks = [asyncio.ensure_future(send()), asyncio.ensure_future(receive())]
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        live_hub.unsubscribe(subscription)
@@ -1,12 +1,24 @@
-from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-import secrets
-from typing import Dict, Optional
-
-from app.db import get_db
+from fastapi import APIRouter, Depends, File, HTTPException, UploadFile, status
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload
+from typing import Any, Dict, Iterable, List, Optional
+import codecs
+import csv
+
+from app.async_db import ASYNC_DB_ENABLED, get_async_read_db
+from app.db import get_db, get_read_db
 from app import models, schemas
-from app.deps import get_current_user
-from app.email_utils import send_participant_qr_email
+from app.authz import require_event_role
+from app.deps import CurrentUser, get_current_user
+from app.live import live_hub
+from app.mailing import enqueue_participant_email, enqueue_participant_emails, start_mailing
+from app.offline import bump_ticket_version
+from app.pagination import PageParams, page_params, paginate, paginate_async
+from app.qr_tokens import generate_qr_token
+from app.scan_index import scan_index
+from app.stats import StatsDelta
 
 router = APIRouter(prefix="/events/{event_id}/participants", tags=["participants"])
 
@@ -18,34 +30,18 @@ def _get_event_or_404(event_id: int, db: Session) -> models.Event:
     return event
 
 
-def _check_user_can_manage_participants(
+def _get_participant_or_404(
     event_id: int,
-    current_user: models.User,
+    participant_id: int,
     db: Session,
-):
-    """Autorise uniquement les superadmins ou les OWNER de l'événement."""
-    if current_user.is_superadmin:
-        return
-
-    rel = (
-        db.query(models.EventAdmin)
-        .filter(
-            models.EventAdmin.event_id == event_id,
-            models.EventAdmin.user_id == current_user.id,
-            models.EventAdmin.role == "OWNER",
-        )
-        .first()
-    )
-    if rel is None:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Accès refusé : admin de l'événement requis",
-        )
-
-
-def _get_participant_or_404(event_id: int, participant_id: int, db: Session) -> models.Participant:
+    with_ticket: bool = False,
+) -> models.Participant:
+    query = db.query(models.Participant)
+    if with_ticket:
+        # participant et ticket en une requête (LEFT OUTER JOIN sur tickets.participant_id)
+        query = query.options(joinedload(models.Participant.ticket))
     participant = (
-        db.query(models.Participant)
+        query
         .filter(
             models.Participant.id == participant_id,
             models.Participant.event_id == event_id,
@@ -57,8 +53,8 @@ def _get_participant_or_404(event_id: int, participant_id: int, db: Session) ->
     return participant
 
 
-def _generate_qr_code() -> str:
-    return secrets.token_urlsafe(16)
+def _generate_qr_code(event_id: int) -> str:
+    return generate_qr_token(event_id)
 
 
 def _participant_to_out(
@@ -79,45 +75,65 @@ def _participant_to_out(
     )
 
 
-@router.get("/", response_model=list[schemas.ParticipantOut])
+def _participant_list_statement(event_id: int):
+    # statut du ticket par jointure indexée sur tickets.participant_id
+    return (
+        select(
+            models.Participant.id,
+            models.Participant.event_id,
+            models.Participant.first_name,
+            models.Participant.last_name,
+            models.Participant.promo,
+            models.Participant.email,
+            models.Participant.tarif,
+            models.Participant.qr_code,
+            models.Ticket.status,
+            models.Ticket.scanned_at,
+        )
+        .outerjoin(models.Ticket, models.Ticket.participant_id == models.Participant.id)
+        .where(models.Participant.event_id == event_id)
+    )
+
+
+PARTICIPANT_SORT = (models.Participant.last_name, models.Participant.id)
+
+
 def list_participants(
     event_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    page: PageParams = Depends(page_params),
+    db: Session = Depends(get_read_db),
+    current_user: CurrentUser = Depends(require_event_role("OWNER")),
 ):
     _get_event_or_404(event_id, db)
-    _check_user_can_manage_participants(event_id, current_user, db)
-    participants = (
-        db.query(models.Participant)
-        .filter(models.Participant.event_id == event_id)
-        .order_by(models.Participant.last_name)
-        .all()
+    return paginate(db, _participant_list_statement(event_id), PARTICIPANT_SORT, page, schemas.ParticipantOut)
+
+
+async def list_participants_async(
+    event_id: int,
+    page: PageParams = Depends(page_params),
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: CurrentUser = Depends(require_event_role("OWNER")),
+):
+    if await db.get(models.Event, event_id) is None:
+        raise HTTPException(status_code=404, detail="Event non trouvé")
+    return await paginate_async(
+        db, _participant_list_statement(event_id), PARTICIPANT_SORT, page, schemas.ParticipantOut
     )
-    qr_codes = [p.qr_code for p in participants]
-    tickets_by_qr: Dict[str, models.Ticket] = {}
-    if qr_codes:
-        tickets = (
-            db.query(models.Ticket)
-            .filter(models.Ticket.qr_code_token.in_(qr_codes))
-            .all()
-        )
-        tickets_by_qr = {t.qr_code_token: t for t in tickets}
 
-    return [
-        _participant_to_out(p, tickets_by_qr.get(p.qr_code))
-        for p in participants
-    ]
+
+router.get("/", response_model=list[schemas.ParticipantOut])(
+    list_participants_async if ASYNC_DB_ENABLED else list_participants
+)
 
 
 @router.post("/", response_model=schemas.ParticipantOut, status_code=status.HTTP_201_CREATED)
 def create_participant(
     event_id: int,
     participant_in: schemas.ParticipantCreate,
-    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
-    event = _get_event_or_404(event_id, db)
+    _get_event_or_404(event_id, db)
 
     participant = models.Participant(
         event_id=event_id,
@@ -126,32 +142,159 @@ def create_participant(
         promo=participant_in.promo,
         email=participant_in.email,
         tarif=participant_in.tarif,
-        qr_code=_generate_qr_code(),
+        qr_code=_generate_qr_code(event_id),
     )
     db.add(participant)
-    db.commit()
-    db.refresh(participant)
+    db.flush()  # id du participant, même transaction que son ticket
 
     ticket = models.Ticket(
         event_id=event_id,
+        participant_id=participant.id,
         user_email=participant.email,  # None si non fourni
         user_name=f"{participant.first_name} {participant.last_name}".strip(),
         qr_code_token=participant.qr_code,
         status="UNUSED",
     )
     db.add(ticket)
+    bump_ticket_version(db, event_id)
+    stats = StatsDelta()
+    stats.register(event_id, participant_in.tarif, participant_in.promo)
+    stats.apply(db)
+    if participant.email:
+        enqueue_participant_email(db, participant.id)
     db.commit()
-    db.refresh(ticket)
+    scan_index.upsert(ticket)
+    live_hub.tickets_changed(event_id, added=[(ticket.id, (participant_in.tarif, participant_in.promo), False)])
 
-    if participant.email:
-        background_tasks.add_task(
-            send_participant_qr_email,
-            event,
-            participant,
-            participant.qr_code,
+    return _participant_to_out(participant, ticket)
+
+
+def _bulk_create_participants(
+    event_id: int,
+    rows: Iterable[Dict[str, Any]],
+    send_emails: bool,
+    db: Session,
+) -> schemas.ParticipantImportReport:
+    """
+    Valide chaque ligne avec ParticipantCreate puis insère participants et
+    tickets en executemany, dans une seule transaction.
+    """
+    report: List[schemas.ParticipantImportRow] = []
+    participants: List[Dict[str, Any]] = []
+    positions: List[int] = []  # index dans report de chaque participant valide
+
+    for position, row in enumerate(rows, start=1):
+        try:
+            participant_in = schemas.ParticipantCreate(**row)
+        except ValidationError as exc:
+            errors = [f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in exc.errors()]
+            report.append(schemas.ParticipantImportRow(row=position, status="error", errors=errors))
+            continue
+        participants.append(
+            {
+                "event_id": event_id,
+                "first_name": participant_in.first_name,
+                "last_name": participant_in.last_name,
+                "promo": participant_in.promo,
+                "email": participant_in.email,
+                "tarif": participant_in.tarif,
+                "qr_code": _generate_qr_code(event_id),
+            }
         )
+        positions.append(len(report))
+        report.append(schemas.ParticipantImportRow(row=position, status="created"))
+
+    if participants:
+        # tables Core (et non entités ORM) : SQLAlchemy groupe alors les lignes par INSERT
+        participants_table = models.Participant.__table__
+        ids_by_qr = {
+            qr_code: participant_id
+            for participant_id, qr_code in db.execute(
+                insert(participants_table).returning(participants_table.c.id, participants_table.c.qr_code),
+                participants,
+            )
+        }
+        db.execute(
+            insert(models.Ticket.__table__),
+            [
+                {
+                    "event_id": event_id,
+                    "participant_id": ids_by_qr[p["qr_code"]],
+                    "user_email": p["email"],
+                    "user_name": f"{p['first_name']} {p['last_name']}".strip(),
+                    "qr_code_token": p["qr_code"],
+                    "status": "UNUSED",
+                }
+                for p in participants
+            ],
+        )
+        bump_ticket_version(db, event_id)
+        stats = StatsDelta()
+        for p in participants:
+            stats.register(event_id, p["tarif"], p["promo"])
+        stats.apply(db)
+        if send_emails:
+            enqueue_participant_emails(
+                db,
+                [ids_by_qr[p["qr_code"]] for p in participants if p["email"]],
+            )
+        db.commit()
 
-    return _participant_to_out(participant, ticket)
+        for index, p in zip(positions, participants):
+            report[index].id = ids_by_qr[p["qr_code"]]
+        if scan_index.is_open(event_id):
+            scan_index.open_event(event_id, db)
+        live_hub.reload(event_id, db)
+
+    return schemas.ParticipantImportReport(
+        created=len(participants),
+        failed=len(report) - len(participants),
+        rows=report,
+    )
+
+
+#import en masse (JSON) : une seule transaction au lieu d'un appel par participant
+@router.post("/bulk", response_model=schemas.ParticipantImportReport, status_code=status.HTTP_201_CREATED)
+def bulk_create_participants(
+    event_id: int,
+    payload: schemas.ParticipantsBulkCreate,
+    db: Session = Depends(get_db),
+    current_user: CurrentUser = Depends(require_event_role("OWNER")),
+):
+    _get_event_or_404(event_id, db)
+    return _bulk_create_participants(event_id, payload.participants, payload.send_emails, db)
+
+
+def _clean_csv_value(value: Optional[str]) -> Optional[str]:
+    # cellule vide ou absente -> None
+    if value is None:
+        return None
+    return value.strip() or None
+
+
+#import CSV (colonnes first_name;last_name;promo;email;tarif), lu au fil de l'eau
+@router.post("/import-csv", response_model=schemas.ParticipantImportReport, status_code=status.HTTP_201_CREATED)
+def import_participants_csv(
+    event_id: int,
+    file: UploadFile = File(...),
+    send_emails: bool = False,
+    delimiter: str = ";",
+    db: Session = Depends(get_db),
+    current_user: CurrentUser = Depends(require_event_role("OWNER")),
+):
+    _get_event_or_404(event_id, db)
+
+    reader = csv.DictReader(codecs.iterdecode(file.file, "utf-8-sig"), delimiter=delimiter)
+    rows = ({key.strip(): _clean_csv_value(value) for key, value in row.items() if key} for row in reader)
+    try:
+        # toutes les lignes sont lues (et validées) avant la première écriture
+        return _bulk_create_participants(event_id, rows, send_emails, db)
+    except UnicodeDecodeError:
+        db.rollback()
+        raise HTTPException(
+            status_code=400,
+            detail="Fichier CSV illisible : encodage UTF-8 attendu (Excel : « CSV UTF-8 »)",
+        )
 
 
 @router.put("/{participant_id}", response_model=schemas.ParticipantOut)
@@ -160,29 +303,34 @@ def update_participant(
     participant_id: int,
     participant_in: schemas.ParticipantUpdate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(require_event_role("OWNER")),
 ):
     _get_event_or_404(event_id, db)
-    _check_user_can_manage_participants(event_id, current_user, db)
-    participant = _get_participant_or_404(event_id, participant_id, db)
+    participant = _get_participant_or_404(event_id, participant_id, db, with_ticket=True)
+    previous = (participant.tarif, participant.promo)
 
     for field, value in participant_in.dict(exclude_unset=True).items():
         setattr(participant, field, value)
 
-    db.commit()
-    db.refresh(participant)
-
-    ticket = (
-        db.query(models.Ticket)
-        .filter(models.Ticket.qr_code_token == participant.qr_code)
-        .first()
-    )
+    ticket = participant.ticket
     if ticket:
         ticket.user_email = participant.email  # None si non fourni
         ticket.user_name = f"{participant.first_name} {participant.last_name}".strip()
-        db.commit()
+        if previous != (participant.tarif, participant.promo):
+            # le ticket change de case dans les statistiques
+            scanned = ticket.status == "SCANNED"
+            stats = StatsDelta()
+            stats.register(event_id, *previous, scanned, ticket.scanned_at, count=-1)
+            stats.register(event_id, participant.tarif, participant.promo, scanned, ticket.scanned_at)
+            stats.apply(db)
+    out = _participant_to_out(participant, ticket)  # avant commit : pas de relecture des attributs expirés
+    ticket_id = ticket.id if ticket else None
+    db.commit()
+    if ticket:
+        scan_index.upsert(ticket)
+        live_hub.tickets_changed(event_id, added=[(ticket_id, (out.tarif, out.promo), out.status == "SCANNED")])
 
-    return _participant_to_out(participant, ticket)
+    return out
 
 
 @router.delete("/{participant_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -190,41 +338,99 @@ def delete_participant(
     event_id: int,
     participant_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(require_event_role("OWNER")),
 ):
     _get_event_or_404(event_id, db)
-    _check_user_can_manage_participants(event_id, current_user, db)
-    participant = _get_participant_or_404(event_id, participant_id, db)
-    ticket = (
-        db.query(models.Ticket)
-        .filter(models.Ticket.qr_code_token == participant.qr_code)
-        .first()
-    )
+    participant = _get_participant_or_404(event_id, participant_id, db, with_ticket=True)
+    ticket = participant.ticket
+    ticket_id = ticket.id if ticket else None
+    token = participant.qr_code
+    db.query(models.EmailDelivery).filter(
+        models.EmailDelivery.participant_id == participant.id
+    ).delete(synchronize_session=False)
     db.delete(participant)
     if ticket:
         db.delete(ticket)
+        bump_ticket_version(db, event_id)
+        stats = StatsDelta()
+        stats.register(
+            event_id, participant.tarif, participant.promo, ticket.status == "SCANNED", ticket.scanned_at, count=-1
+        )
+        stats.apply(db)
     db.commit()
+    scan_index.discard(event_id, token)
+    if ticket_id is not None:
+        live_hub.tickets_changed(event_id, removed=[ticket_id])
 
 
 @router.post("/{participant_id}/send-email")
 def send_participant_email(
     event_id: int,
     participant_id: int,
-    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(require_event_role("OWNER")),
 ):
-    event = _get_event_or_404(event_id, db)
-    _check_user_can_manage_participants(event_id, current_user, db)
+    _get_event_or_404(event_id, db)
     participant = _get_participant_or_404(event_id, participant_id, db)
 
     if not participant.email:
         raise HTTPException(status_code=400, detail="Participant sans email")
 
-    background_tasks.add_task(
-        send_participant_qr_email,
-        event,
-        participant,
-        participant.qr_code,
-    )
+    enqueue_participant_email(db, participant.id)
+    db.commit()
     return {"status": "queued"}
+
+
+def _mailing_to_out(mailing: models.Mailing) -> schemas.MailingOut:
+    return schemas.MailingOut(
+        id=mailing.id,
+        event_id=mailing.event_id,
+        status=mailing.status,
+        force=bool(mailing.force),
+        total=mailing.total,
+        queued=max(mailing.total - mailing.sent - mailing.failed - mailing.skipped, 0),
+        sent=mailing.sent,
+        failed=mailing.failed,
+        skipped=mailing.skipped,
+        created_at=mailing.created_at,
+        finished_at=mailing.finished_at,
+    )
+
+
+#envoi du QR code à tous les participants (déjà servis ignorés sauf force=true)
+@router.post("/send-emails", response_model=schemas.MailingOut, status_code=status.HTTP_202_ACCEPTED)
+def send_all_participant_emails(
+    event_id: int,
+    force: bool = False,
+    db: Session = Depends(get_db),
+    current_user: CurrentUser = Depends(require_event_role("OWNER")),
+):
+    _get_event_or_404(event_id, db)
+    mailing = start_mailing(db, event_id, force=force)
+    if mailing.force != force:
+        # un mailing est déjà en cours avec l'autre option : on ne le fait pas passer pour celui demandé
+        raise HTTPException(
+            status_code=409,
+            detail=f"Un mailing est déjà en cours (id {mailing.id}, force={str(mailing.force).lower()})",
+        )
+    return _mailing_to_out(mailing)
+
+
+@router.get("/send-emails/{mailing_id}", response_model=schemas.MailingOut)
+def get_mailing_status(
+    event_id: int,
+    mailing_id: int,
+    db: Session = Depends(get_read_db),
+    current_user: CurrentUser = Depends(require_event_role("OWNER")),
+):
+    mailing = (
+        db.query(models.Mailing)
+        .filter(
+            models.Mailing.id == mailing_id,
+            models.Mailing.event_id == event_id,
+        )
+        .first()
+    )
+    if not mailing:
+        raise HTTPException(status_code=404, detail="Mailing non trouvé")
+    return _mailing_to_out(mailing)
@@ -1,65 +1,132 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
+from sqlalchemy import case, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from datetime import datetime
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
 
-from app.db import get_db
+from app.async_db import ASYNC_DB_ENABLED, get_async_db
+from app.authz import require_event_role
+from app.db import get_db, get_read_db
 from app import models, schemas
+from app.deps import CurrentUser
+from app.live import live_hub
+from app.offline import get_snapshot
+from app.pagination import PageParams, page_params, paginate
+from app.qr_tokens import is_signed_token, signed_token_event_id
+from app.scan_index import scan_index
+from app.stats import record_scans, record_scans_async
 
 router = APIRouter(prefix="/scan", tags=["scan"])
 
+# nombre de tokens par requête IN (...) pour rester sous la limite de paramètres SQLite
+BATCH_CHUNK_SIZE = 300
+
+
+def _reject_without_db(token: str, event_id: Optional[int]) -> Optional[schemas.ScanResult]:
+    """Refus décidable sans la DB grâce aux tokens signés, None sinon."""
+    if not is_signed_token(token):
+        return None
+
+    token_event_id = signed_token_event_id(token)
+    if token_event_id is None:
+        return schemas.ScanResult(valid=False, reason="invalid_signature")
+    if event_id is not None and token_event_id != event_id:
+        return schemas.ScanResult(valid=False, reason="wrong_event", event_id=token_event_id)
+    # signature valide : seule la DB sait si le ticket existe (créé par un autre worker,
+    # par app.datagen...), même quand l'index de ce processus ne le connaît pas
+    return None
 
-@router.post("/", response_model=schemas.ScanResult)
-def scan_ticket(
-    payload: schemas.ScanRequest,
-    db: Session = Depends(get_db),
-):
-    token = payload.token
 
-    # On cherche le ticket qui correspond au token
-    ticket = (
-        db.query(models.Ticket)
-        .filter(models.Ticket.qr_code_token == token)
-        .first()
+def _participant_column(column):
+    # tarif / promo du participant lus par le RETURNING du UPDATE, pour les statistiques
+    return (
+        select(column)
+        .where(models.Participant.id == models.Ticket.participant_id)
+        .scalar_subquery()
+        .label(column.key)
     )
 
-    if ticket is None:
-        # Aucun ticket ne correspond à ce token
-        return schemas.ScanResult(
-            valid=False,
-            reason="ticket_not_found",
-        )
 
-    # Si déjà scanné
-    if ticket.status == "SCANNED":
-        return schemas.ScanResult(
-            valid=False,
-            reason="already_scanned",
-            user_email=ticket.user_email,
-            user_name=ticket.user_name,
-            event_id=ticket.event_id,
-            status=ticket.status,
+def _index_claim_statement(ticket_id: int, now: datetime):
+    return (
+        update(models.Ticket)
+        .where(
+            models.Ticket.id == ticket_id,
+            models.Ticket.status == "UNUSED",
         )
+        .values(status="SCANNED", scanned_at=now)
+        .returning(_participant_column(models.Participant.tarif), _participant_column(models.Participant.promo))
+        .execution_options(synchronize_session=False)
+    )
 
-    # Si dans un autre état que UNUSED (ex: CANCELED)
-    if ticket.status != "UNUSED":
-        return schemas.ScanResult(
-            valid=False,
-            reason="invalid_status",
-            user_email=ticket.user_email,
-            user_name=ticket.user_name,
-            event_id=ticket.event_id,
-            status=ticket.status,
+
+def _claim_statement(token: str, event_id: Optional[int], now: datetime):
+    conditions = [
+        models.Ticket.qr_code_token == token,
+        models.Ticket.status == "UNUSED",
+    ]
+    if event_id is not None:
+        conditions.append(models.Ticket.event_id == event_id)
+
+    # Transition UNUSED -> SCANNED en une seule requête conditionnelle :
+    # si deux portes scannent en même temps, une seule ligne est modifiée
+    return (
+        update(models.Ticket)
+        .where(*conditions)
+        .values(status="SCANNED", scanned_at=now)
+        .returning(
+            models.Ticket.id,
+            models.Ticket.user_email,
+            models.Ticket.user_name,
+            models.Ticket.event_id,
+            _participant_column(models.Participant.tarif),
+            _participant_column(models.Participant.promo),
         )
+        .execution_options(synchronize_session=False)
+    )
 
-    # 4) Ticket valide : on le marque comme scanné
-    ticket.status = "SCANNED"
-    ticket.scanned_at = datetime.utcnow()
-    db.commit()
-    db.refresh(ticket)
 
+def _index_result(entry) -> schemas.ScanResult:
     return schemas.ScanResult(
         valid=True,
         reason=None,
+        user_email=entry.user_email,
+        user_name=entry.user_name,
+        event_id=entry.event_id,
+        status="SCANNED",
+    )
+
+
+def _claimed_result(claimed) -> schemas.ScanResult:
+    return schemas.ScanResult(
+        valid=True,
+        reason=None,
+        user_email=claimed.user_email,
+        user_name=claimed.user_name,
+        event_id=claimed.event_id,
+        status="SCANNED",
+    )
+
+
+def _refusal(ticket, event_id: Optional[int]) -> schemas.ScanResult:
+    if ticket is None:
+        # Aucun ticket ne correspond à ce token
+        return schemas.ScanResult(
+            valid=False,
+            reason="ticket_not_found",
+        )
+
+    # Autre événement, déjà scanné, ou dans un autre état que UNUSED (ex: CANCELED)
+    if event_id is not None and ticket.event_id != event_id:
+        reason = "wrong_event"
+    elif ticket.status == "SCANNED":
+        reason = "already_scanned"
+    else:
+        reason = "invalid_status"
+    return schemas.ScanResult(
+        valid=False,
+        reason=reason,
         user_email=ticket.user_email,
         user_name=ticket.user_name,
         event_id=ticket.event_id,
@@ -67,21 +134,333 @@ def scan_ticket(
     )
 
 
+def _refusal_statement(token: str):
+    return select(
+        models.Ticket.event_id,
+        models.Ticket.status,
+        models.Ticket.user_email,
+        models.Ticket.user_name,
+    ).where(models.Ticket.qr_code_token == token)
+
+
+def _scan_from_index(token: str, event_id: Optional[int], db: Session) -> Optional[schemas.ScanResult]:
+    """
+    Scan d'un ticket de l'index mémoire : on connaît déjà son id, le UPDATE
+    conditionnel se fait sur la clé primaire et un scan valide ne lit rien.
+    L'index n'est pas la référence (voir app/scan_index.py) : tout refus est
+    relu en base. None si le ticket n'est pas dans l'index : scan par la DB.
+    """
+    entry = scan_index.get(token)
+    if entry is None:
+        return None
+    now = datetime.utcnow()
+
+    if event_id is None or entry.event_id == event_id:
+        claimed = db.execute(_index_claim_statement(entry.ticket_id, now)).first()
+        if claimed is not None:
+            record_scans(db, [(entry.event_id, claimed.tarif, claimed.promo, now)])
+            db.commit()
+            scan_index.mark_scanned(token, now)
+            live_hub.ticket_scanned(entry.event_id, entry.ticket_id, entry.user_name, now)
+            return _index_result(entry)
+
+    # déjà scanné, supprimé ou autre événement, peut-être par un autre worker
+    ticket = db.execute(_refusal_statement(token)).first()
+    if ticket is None:
+        scan_index.discard(entry.event_id, token)
+    return _refusal(ticket, event_id)
+
+
+async def _scan_from_index_async(token: str, event_id: Optional[int], db) -> Optional[schemas.ScanResult]:
+    """Version AsyncSession de _scan_from_index."""
+    entry = scan_index.get(token)
+    if entry is None:
+        return None
+    now = datetime.utcnow()
+
+    if event_id is None or entry.event_id == event_id:
+        claimed = (await db.execute(_index_claim_statement(entry.ticket_id, now))).first()
+        if claimed is not None:
+            await record_scans_async(db, [(entry.event_id, claimed.tarif, claimed.promo, now)])
+            await db.commit()
+            scan_index.mark_scanned(token, now)
+            live_hub.ticket_scanned(entry.event_id, entry.ticket_id, entry.user_name, now)
+            return _index_result(entry)
+
+    ticket = (await db.execute(_refusal_statement(token))).first()
+    if ticket is None:
+        scan_index.discard(entry.event_id, token)
+    return _refusal(ticket, event_id)
+
+
+def scan_ticket(
+    payload: schemas.ScanRequest,
+    db: Session = Depends(get_db),
+):
+    token = payload.token
+
+    rejected = _reject_without_db(token, payload.event_id)
+    if rejected is not None:
+        return rejected
+
+    # Événement ouvert au scan : on ne lit pas la DB
+    indexed = _scan_from_index(token, payload.event_id, db)
+    if indexed is not None:
+        return indexed
+
+    now = datetime.utcnow()
+    claimed = db.execute(_claim_statement(token, payload.event_id, now)).first()
+    if claimed is not None:
+        record_scans(db, [(claimed.event_id, claimed.tarif, claimed.promo, now)])
+    db.commit()
+
+    if claimed is not None:
+        live_hub.ticket_scanned(claimed.event_id, claimed.id, claimed.user_name, now)
+        return _claimed_result(claimed)
+
+    # Échec : on ne relit le ticket que pour expliquer le refus
+    return _refusal(db.execute(_refusal_statement(token)).first(), payload.event_id)
+
+
+async def scan_ticket_async(
+    payload: schemas.ScanRequest,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Même scan que scan_ticket, sans bloquer de thread pendant l'attente de la DB."""
+    token = payload.token
+
+    rejected = _reject_without_db(token, payload.event_id)
+    if rejected is not None:
+        return rejected
+
+    indexed = await _scan_from_index_async(token, payload.event_id, db)
+    if indexed is not None:
+        return indexed
+
+    now = datetime.utcnow()
+    claimed = (await db.execute(_claim_statement(token, payload.event_id, now))).first()
+    if claimed is not None:
+        await record_scans_async(db, [(claimed.event_id, claimed.tarif, claimed.promo, now)])
+    await db.commit()
+
+    if claimed is not None:
+        live_hub.ticket_scanned(claimed.event_id, claimed.id, claimed.user_name, now)
+        return _claimed_result(claimed)
+
+    return _refusal((await db.execute(_refusal_statement(token))).first(), payload.event_id)
+
+
+#ASYNC_DB=1 : la route de scan passe par la version async
+router.post("/", response_model=schemas.ScanResult)(scan_ticket_async if ASYNC_DB_ENABLED else scan_ticket)
+
+
+def _as_utc_naive(value: Optional[datetime], default: datetime) -> datetime:
+    # la DB stocke des dates UTC naïves (comme datetime.utcnow())
+    if value is None:
+        return default
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _scan_batch(
+    items: List[schemas.ScanBatchItem],
+    db: Session,
+    event_id: Optional[int] = None,
+) -> List[schemas.ScanResult]:
+    """
+    Applique une liste de scans en une transaction.
+    Les scans sont départagés par heure client puis par position dans la liste :
+    le premier scan d'un token gagne, les suivants sont "already_scanned",
+    comme ceux d'un token déjà scanné par un lot précédent.
+    Si event_id est donné, les tickets d'un autre événement sont refusés.
+    """
+    now = datetime.utcnow()
+    rejected = [_reject_without_db(item.token, event_id) for item in items]
+    tokens = list({item.token for item, refusal in zip(items, rejected) if refusal is None})
+
+    # Résolution de tous les tokens en quelques requêtes ensemblistes
+    tickets = {}
+    for start in range(0, len(tokens), BATCH_CHUNK_SIZE):
+        chunk = tokens[start:start + BATCH_CHUNK_SIZE]
+        rows = db.query(
+            models.Ticket.id,
+            models.Ticket.qr_code_token,
+            models.Ticket.status,
+            models.Ticket.user_email,
+            models.Ticket.user_name,
+            models.Ticket.event_id,
+        ).filter(models.Ticket.qr_code_token.in_(chunk))
+        for row in rows:
+            tickets[row.qr_code_token] = row
+
+    scanned_at = [_as_utc_naive(item.scanned_at, now) for item in items]
+    order = sorted(range(len(items)), key=lambda i: (scanned_at[i], i))
+
+    reasons: List[Optional[str]] = [None] * len(items)
+    claims: Dict[str, int] = {}  # token -> position du scan gagnant
+    for i in order:
+        token = items[i].token
+        ticket = tickets.get(token)
+        if rejected[i] is not None:
+            reasons[i] = rejected[i].reason
+        elif ticket is None:
+            reasons[i] = "ticket_not_found"
+        elif event_id is not None and ticket.event_id != event_id:
+            reasons[i] = "wrong_event"
+        elif token in claims or ticket.status == "SCANNED":
+            reasons[i] = "already_scanned"
+        elif ticket.status != "UNUSED":
+            reasons[i] = "invalid_status"
+        else:
+            claims[token] = i
+
+    # Transitions conditionnelles, une requête par paquet, un seul commit
+    claimed_keys: Dict[int, tuple] = {}  # ticket_id -> (tarif, promo)
+    claim_items = list(claims.items())
+    for start in range(0, len(claim_items), BATCH_CHUNK_SIZE):
+        chunk = {tickets[token].id: scanned_at[i] for token, i in claim_items[start:start + BATCH_CHUNK_SIZE]}
+        rows = db.execute(
+            update(models.Ticket)
+            .where(
+                models.Ticket.id.in_(list(chunk)),
+                models.Ticket.status == "UNUSED",
+            )
+            .values(
+                status="SCANNED",
+                scanned_at=case(chunk, value=models.Ticket.id),
+            )
+            .returning(
+                models.Ticket.id,
+                _participant_column(models.Participant.tarif),
+                _participant_column(models.Participant.promo),
+            )
+            .execution_options(synchronize_session=False)
+        )
+        claimed_keys.update((row.id, (row.tarif, row.promo)) for row in rows)
+    record_scans(
+        db,
+        [
+            (tickets[token].event_id, *claimed_keys[tickets[token].id], scanned_at[i])
+            for token, i in claims.items()
+            if tickets[token].id in claimed_keys
+        ],
+    )
+    db.commit()
+
+    for token, i in claims.items():
+        if tickets[token].id in claimed_keys:
+            scan_index.mark_scanned(token, scanned_at[i])
+            live_hub.ticket_scanned(tickets[token].event_id, tickets[token].id, tickets[token].user_name, scanned_at[i])
+        else:
+            # scanné par une autre requête entre la lecture et l'écriture
+            reasons[i] = "already_scanned"
+
+    results = []
+    for i, item in enumerate(items):
+        ticket = tickets.get(item.token)
+        if rejected[i] is not None:
+            results.append(rejected[i])
+            continue
+        if ticket is None:
+            results.append(schemas.ScanResult(valid=False, reason=reasons[i]))
+            continue
+        results.append(
+            schemas.ScanResult(
+                valid=reasons[i] is None,
+                reason=reasons[i],
+                user_email=ticket.user_email,
+                user_name=ticket.user_name,
+                event_id=ticket.event_id,
+                status="SCANNED" if reasons[i] in (None, "already_scanned") else ticket.status,
+            )
+        )
+    return results
+
+
+# Scans mis en tampon par un téléphone puis envoyés d'un coup
+@router.post("/batch", response_model=list[schemas.ScanResult])
+def scan_tickets_batch(
+    payload: schemas.ScanBatchRequest,
+    db: Session = Depends(get_db),
+):
+    return _scan_batch(payload.scans, db)
+
+
+# Snapshot binaire pour valider les QR codes sans réseau
+@router.get("/events/{event_id}/snapshot")
+def download_offline_snapshot(
+    event_id: int,
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_read_db),
+):
+    event = db.query(models.Event).filter(models.Event.id == event_id).first()
+    if not event:
+        raise HTTPException(status_code=404, detail="Event non trouvé")
+
+    version, snapshot = get_snapshot(db, event_id)
+    etag = f'"{event_id}-{version}"'
+    headers = {"ETag": etag, "X-Ticket-Version": str(version)}
+    if if_none_match == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=snapshot, media_type="application/octet-stream", headers=headers)
+
+
+# Remontée des scans faits hors-ligne une fois le réseau revenu
+@router.post("/events/{event_id}/offline-scans", response_model=list[schemas.ScanResult])
+def upload_offline_scans(
+    event_id: int,
+    payload: schemas.ScanBatchRequest,
+    db: Session = Depends(get_db),
+):
+    return _scan_batch(payload.scans, db, event_id=event_id)
+
+
+def _get_event_or_404(event_id: int, db: Session) -> models.Event:
+    event = db.query(models.Event).filter(models.Event.id == event_id).first()
+    if not event:
+        raise HTTPException(status_code=404, detail="Event non trouvé")
+    return event
+
+
+# Chargement de l'index mémoire de ce worker quand les portes ouvrent (admins et scanneurs de l'événement)
+@router.post("/events/{event_id}/open")
+def open_event_for_scan(
+    event_id: int,
+    db: Session = Depends(get_db),
+    current_user: CurrentUser = Depends(require_event_role("SCANNER_ONLY")),
+):
+    _get_event_or_404(event_id, db)
+
+    count = scan_index.open_event(event_id, db)
+    return {"event_id": event_id, "tickets": count}
+
+
+@router.post("/events/{event_id}/close")
+def close_event_for_scan(
+    event_id: int,
+    db: Session = Depends(get_read_db),
+    current_user: CurrentUser = Depends(require_event_role("SCANNER_ONLY")),
+):
+    _get_event_or_404(event_id, db)
+
+    scan_index.close_event(event_id)
+    return {"event_id": event_id, "status": "closed"}
+
+
 # On renvoie tout brut pour debug et voir les qr-code
 @router.get("/debug_raw", tags=["tickets-debug"])
 def list_raw_tickets(
     event_id: int,
-    db: Session = Depends(get_db),
+    page: PageParams = Depends(page_params),
+    db: Session = Depends(get_read_db),
 ):
-    tickets = db.query(models.Ticket).filter(models.Ticket.event_id == event_id).all()
-    return [
-        {
-            "id": t.id,
-            "user_email": t.user_email,
-            "user_name": t.user_name,
-            "qr_code_token": t.qr_code_token,
-            "status": t.status,
-            "scanned_at": t.scanned_at,
-        }
-        for t in tickets
-    ]
+    statement = select(
+        models.Ticket.id,
+        models.Ticket.user_email,
+        models.Ticket.user_name,
+        models.Ticket.qr_code_token,
+        models.Ticket.status,
+        models.Ticket.scanned_at,
+    ).where(models.Ticket.event_id == event_id)
+    return paginate(db, statement, (models.Ticket.id,), page)
@@ -1,10 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import or_
-from .. import models, schemas
-from ..db import get_db
+from sqlalchemy import bindparam, select, update
+from .. import models, schemas, student_search
+from ..db import get_db, get_read_db, upsert_insert
+from ..pagination import PageParams, page_params, paginate
+import codecs
 import csv
-from sqlalchemy.exc import IntegrityError
 
 router = APIRouter(
     prefix="/students",
@@ -12,8 +13,18 @@ router = APIRouter(
 )
 
 @router.get("/", response_model=list[schemas.Student])
-def list_students(db: Session = Depends(get_db)):
-    return db.query(models.Student).all()
+def list_students(
+    page: PageParams = Depends(page_params),
+    db: Session = Depends(get_read_db),
+):
+    statement = select(
+        models.Student.id,
+        models.Student.first_name,
+        models.Student.last_name,
+        models.Student.email,
+        models.Student.is_external,
+    )
+    return paginate(db, statement, (models.Student.id,), page, schemas.Student)
 
 @router.post("/", response_model=schemas.Student)
 def create_student(student: schemas.StudentCreate, db: Session = Depends(get_db)):
@@ -31,50 +42,123 @@ def create_student(student: schemas.StudentCreate, db: Session = Depends(get_db)
     return db_student
 
 
+# taille des paquets écrits en base pendant l'import
+IMPORT_CHUNK_SIZE = 1000
+
+
+def _is_external_email(email: str) -> bool:
+    return not (
+        email.endswith("@eleves.enpc.fr")
+        or email.endswith("@enpc.fr")
+    )
+
+
+def _write_students_chunk(db: Session, chunk: list[dict], update_existing: bool) -> tuple[int, int, int]:
+    """Insère les nouveaux élèves du paquet (INSERT ... ON CONFLICT DO NOTHING), renvoie (insérés, mis à jour, ignorés)."""
+    table = models.Student.__table__
+    existing = {
+        email: (first_name, last_name)
+        for email, first_name, last_name in db.execute(
+            select(table.c.email, table.c.first_name, table.c.last_name)
+            .where(table.c.email.in_([row["email"] for row in chunk]))
+        )
+    }
+
+    new_rows = [row for row in chunk if row["email"] not in existing]
+    inserted = 0
+    if new_rows:
+        result = db.execute(
+            upsert_insert(db, table)
+            .on_conflict_do_nothing(index_elements=["email"])
+            .returning(table.c.id),
+            new_rows,
+        )
+        inserted = len(result.all())
+
+    changed = []
+    if update_existing:
+        changed = [
+            {"b_email": row["email"], "b_first_name": row["first_name"], "b_last_name": row["last_name"]}
+            for row in chunk
+            if row["email"] in existing and existing[row["email"]] != (row["first_name"], row["last_name"])
+        ]
+    if changed:
+        db.execute(
+            update(table)
+            .where(table.c.email == bindparam("b_email"))
+            .values(first_name=bindparam("b_first_name"), last_name=bindparam("b_last_name")),
+            changed,
+        )
+
+    return inserted, len(changed), len(chunk) - inserted - len(changed)
+
+
 @router.post("/import-csv")
-async def import_students_csv(
+def import_students_csv(
     file: UploadFile = File(...),
+    update_existing: bool = Query(False, description="Met à jour nom/prénom des emails déjà connus"),
     db: Session = Depends(get_db),
 ):
-    content = await file.read()
-    text = content.decode("utf-8")
-    lines = text.splitlines()
-
-    reader = csv.DictReader(lines, delimiter=";")
+    # lecture ligne à ligne du fichier reçu, sans le charger entièrement en mémoire
+    reader = csv.DictReader(codecs.iterdecode(file.file, "utf-8-sig"), delimiter=";")
 
     inserted = 0
+    updated = 0
     skipped_duplicates = 0
-
-    for row in reader:
-        first_name = row["first_name"].strip()
-        last_name  = row["last_name"].strip()
-        email      = row["email"].strip()
-
-        is_external = not (
-            email.endswith("@eleves.enpc.fr")
-            or email.endswith("@enpc.fr")
-        )
-
-        student = models.Student(
-            first_name=first_name,
-            last_name=last_name,
-            email=email,
-            is_external=is_external,
+    skipped_invalid = 0
+    seen_emails = set()
+    chunk = []
+
+    try:
+        for row in reader:
+            first_name = (row.get("first_name") or "").strip()
+            last_name  = (row.get("last_name") or "").strip()
+            email      = (row.get("email") or "").strip()
+
+            # ligne sans email
+            if not email:
+                skipped_invalid += 1
+                continue
+            # email déjà vu plus haut dans le fichier
+            if email in seen_emails:
+                skipped_duplicates += 1
+                continue
+            seen_emails.add(email)
+
+            chunk.append(
+                {
+                    "first_name": first_name,
+                    "last_name": last_name,
+                    "email": email,
+                    "is_external": _is_external_email(email),
+                }
+            )
+            if len(chunk) >= IMPORT_CHUNK_SIZE:
+                counts = _write_students_chunk(db, chunk, update_existing)
+                inserted += counts[0]
+                updated += counts[1]
+                skipped_duplicates += counts[2]
+                chunk = []
+    except UnicodeDecodeError:
+        # rien n'est commité avant la fin du fichier
+        db.rollback()
+        raise HTTPException(
+            status_code=400,
+            detail="Fichier CSV illisible : encodage UTF-8 attendu (Excel : « CSV UTF-8 »)",
         )
 
-        db.add(student)
-        try:
-            db.commit()          # on essaie d’insérer
-            db.refresh(student)
-            inserted += 1
-        except IntegrityError:
-            db.rollback()        # doublon => on annule
-            skipped_duplicates += 1
-            continue
+    if chunk:
+        counts = _write_students_chunk(db, chunk, update_existing)
+        inserted += counts[0]
+        updated += counts[1]
+        skipped_duplicates += counts[2]
+    db.commit()
 
     return {
         "inserted": inserted,
+        "updated": updated,
         "skipped_duplicates": skipped_duplicates,
+        "skipped_invalid": skipped_invalid,
     }
 
 
@@ -83,7 +167,7 @@ async def import_students_csv(
 @router.get("/search", response_model=list[schemas.Student])
 def search_students(
     q: str = Query("", description="Fragment de nom, prénom ou email"),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
     if not q:
         # on limite à 8 élèves si la saisie q est vide  
@@ -94,20 +178,8 @@ def search_students(
             .all()
         )
 
-    like = f"%{q}%"
-    return (
-        db.query(models.Student)
-        .filter(
-            or_(
-                models.Student.first_name.ilike(like),
-                models.Student.last_name.ilike(like),
-                models.Student.email.ilike(like),
-            )
-        )
-        .order_by(models.Student.last_name)
-        .limit(8)
-        .all()
-    )
+    #index plein texte (préfixes, sans accents), noms de famille en premier
+    return student_search.search_students(db, q, limit=8)
 
 #créer un étudiant externe
 @router.post("/external", response_model=schemas.Student)
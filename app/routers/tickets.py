@@ -1,18 +1,24 @@
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from datetime import datetime
-import secrets
 
-from app.db import get_db
+from app.db import get_db, get_read_db
 from app import models, schemas
+from app.live import live_hub
+from app.offline import bump_ticket_version
+from app.pagination import PageParams, page_params, paginate
+from app.qr_tokens import generate_qr_token
+from app.scan_index import scan_index
+from app.stats import StatsDelta
 
 
 router = APIRouter(prefix="/events/{event_id}/tickets", tags=["tickets"])
 
 #les deux fonctions de créations ne servent pas dans le front end, c'est si jamais on veut créer des tickets indépendamment d'un participant
-def generate_ticket_token() -> str:
-    """Génère un token aléatoire pour le ticket (ce sera ce qu'on mettra dans le QR code)"""
-    return secrets.token_urlsafe(16)
+def generate_ticket_token(event_id: int) -> str:
+    """Génère le token du ticket (ce sera ce qu'on mettra dans le QR code)"""
+    return generate_qr_token(event_id)
 
 
 @router.post("/", response_model=schemas.TicketOut)
@@ -29,14 +35,20 @@ def create_ticket(
         event_id=event_id,
         user_email=data.user_email,
         user_name=data.user_name,
-        qr_code_token=generate_ticket_token(),
+        qr_code_token=generate_ticket_token(event_id),
         status="UNUSED",
         scanned_at=None,
     )
 
     db.add(ticket)
+    bump_ticket_version(db, event_id)
+    stats = StatsDelta()
+    stats.register(event_id, None, None)
+    stats.apply(db)
     db.commit()
     db.refresh(ticket)
+    scan_index.upsert(ticket)
+    live_hub.tickets_changed(event_id, added=[(ticket.id, (None, None), False)])
     return ticket
 
 
@@ -58,18 +70,24 @@ def create_tickets_bulk(
             event_id=event_id,
             user_email=attendee.user_email,
             user_name=attendee.user_name,
-            qr_code_token=generate_ticket_token(),
+            qr_code_token=generate_ticket_token(event_id),
             status="UNUSED",
             scanned_at=None,
         )
         db.add(ticket)
         created_tickets.append(ticket)
 
+    bump_ticket_version(db, event_id)
+    stats = StatsDelta()
+    stats.register(event_id, None, None, count=len(created_tickets))
+    stats.apply(db)
     db.commit()
 
     # Refresh pour avoir les IDs
     for t in created_tickets:
         db.refresh(t)
+        scan_index.upsert(t)
+    live_hub.reload(event_id, db)
 
     return created_tickets
 
@@ -77,11 +95,20 @@ def create_tickets_bulk(
 @router.get("/", response_model=list[schemas.TicketOut])
 def list_tickets_for_event(
     event_id: int,
-    db: Session = Depends(get_db),
+    page: PageParams = Depends(page_params),
+    db: Session = Depends(get_read_db),
 ):
     event = db.query(models.Event).filter(models.Event.id == event_id).first()
     if not event:
         raise HTTPException(status_code=404, detail="Event non trouvé")
 
-    tickets = db.query(models.Ticket).filter(models.Ticket.event_id == event_id).all()
-    return tickets
+    statement = select(
+        models.Ticket.id,
+        models.Ticket.event_id,
+        models.Ticket.user_email,
+        models.Ticket.user_name,
+        models.Ticket.qr_code_token,
+        models.Ticket.status,
+        models.Ticket.scanned_at,
+    ).where(models.Ticket.event_id == event_id)
+    return paginate(db, statement, (models.Ticket.id,), page, schemas.TicketOut)
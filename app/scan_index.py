@@ -0,0 +1,123 @@
+import threading
+from datetime import datetime
+from typing import Dict, Optional, Set
+
+from sqlalchemy.orm import Session
+
+from app import models
+
+
+class IndexedTicket:
+    """Vue compacte d'un ticket gardée en mémoire pendant le scan."""
+
+    __slots__ = ("ticket_id", "event_id", "status", "user_name", "user_email", "scanned_at")
+
+    def __init__(
+        self,
+        ticket_id: int,
+        event_id: int,
+        status: Optional[str],
+        user_name: Optional[str],
+        user_email: Optional[str],
+        scanned_at: Optional[datetime],
+    ) -> None:
+        self.ticket_id = ticket_id
+        self.event_id = event_id
+        self.status = status
+        self.user_name = user_name
+        self.user_email = user_email
+        self.scanned_at = scanned_at
+
+
+class ScanIndex:
+    """
+    Index token -> ticket des événements "ouverts" au scan.
+    Il évite au scan de chercher le ticket par son token : le UPDATE
+    conditionnel se fait directement sur l'id. Les événements non ouverts
+    continuent de passer par la DB.
+
+    L'index est propre au processus : ouvrir ou fermer un événement, et les
+    mises à jour (upsert / discard) après une écriture, ne touchent que le
+    worker uvicorn qui a servi la requête. Il n'est donc jamais la référence :
+    la DB tranche chaque scan (UPDATE ... WHERE status = 'UNUSED'), et tout
+    refus est relu en base. Un ticket absent de l'index passe par la DB.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._tickets: Dict[str, IndexedTicket] = {}
+        self._tokens_by_event: Dict[int, Set[str]] = {}
+
+    def open_event(self, event_id: int, db: Session) -> int:
+        """(Re)charge tous les tickets de l'événement, renvoie leur nombre."""
+        rows = (
+            db.query(
+                models.Ticket.id,
+                models.Ticket.qr_code_token,
+                models.Ticket.status,
+                models.Ticket.user_name,
+                models.Ticket.user_email,
+                models.Ticket.scanned_at,
+            )
+            .filter(models.Ticket.event_id == event_id)
+            .all()
+        )
+        loaded = {
+            token: IndexedTicket(ticket_id, event_id, status, user_name, user_email, scanned_at)
+            for ticket_id, token, status, user_name, user_email, scanned_at in rows
+        }
+        with self._lock:
+            self._drop_event(event_id)
+            self._tickets.update(loaded)
+            self._tokens_by_event[event_id] = set(loaded)
+        return len(loaded)
+
+    def close_event(self, event_id: int) -> None:
+        with self._lock:
+            self._drop_event(event_id)
+
+    def is_open(self, event_id: int) -> bool:
+        return event_id in self._tokens_by_event
+
+    def get(self, token: str) -> Optional[IndexedTicket]:
+        return self._tickets.get(token)
+
+    def mark_scanned(self, token: str, scanned_at: datetime) -> None:
+        """Reporte en mémoire un scan écrit en base."""
+        with self._lock:
+            entry = self._tickets.get(token)
+            if entry is not None:
+                entry.status = "SCANNED"
+                entry.scanned_at = scanned_at
+
+    def upsert(self, ticket: models.Ticket) -> None:
+        """À appeler après création / modification d'un ticket."""
+        with self._lock:
+            tokens = self._tokens_by_event.get(ticket.event_id)
+            if tokens is None:
+                return
+            self._tickets[ticket.qr_code_token] = IndexedTicket(
+                ticket.id,
+                ticket.event_id,
+                ticket.status,
+                ticket.user_name,
+                ticket.user_email,
+                ticket.scanned_at,
+            )
+            tokens.add(ticket.qr_code_token)
+
+    def discard(self, event_id: int, token: str) -> None:
+        """À appeler après suppression d'un ticket."""
+        with self._lock:
+            tokens = self._tokens_by_event.get(event_id)
+            if tokens is None or token not in tokens:
+                return
+            tokens.discard(token)
+            self._tickets.pop(token, None)
+
+    def _drop_event(self, event_id: int) -> None:
+        for token in self._tokens_by_event.pop(event_id, ()):
+            self._tickets.pop(token, None)
+
+
+scan_index = ScanIndex()
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, EmailStr
 from datetime import datetime
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 
 
 class UserBase(BaseModel):
@@ -60,6 +60,16 @@ class TicketOut(BaseModel):
 
 class ScanRequest(BaseModel):
     token: str
+    event_id: Optional[int] = None  # event scanné à cette porte, pour refuser les autres
+
+
+class ScanBatchItem(BaseModel):
+    token: str
+    scanned_at: Optional[datetime] = None  # heure du scan sur le téléphone
+
+
+class ScanBatchRequest(BaseModel):
+    scans: List[ScanBatchItem]
 
 
 class ScanResult(BaseModel):
@@ -108,6 +118,24 @@ class ParticipantUpdate(BaseModel):
     tarif: Optional[str] = None
 
 
+class ParticipantsBulkCreate(BaseModel):
+    participants: List[Dict[str, Any]]  # validées ligne par ligne avec ParticipantCreate
+    send_emails: bool = False
+
+
+class ParticipantImportRow(BaseModel):
+    row: int  # position dans l'envoi, à partir de 1
+    status: str  # created / error
+    id: Optional[int] = None
+    errors: Optional[List[str]] = None
+
+
+class ParticipantImportReport(BaseModel):
+    created: int
+    failed: int
+    rows: List[ParticipantImportRow]
+
+
 class ParticipantOut(ParticipantBase):
     id: int
     event_id: int
@@ -117,3 +145,39 @@ class ParticipantOut(ParticipantBase):
 
     class Config:
         orm_mode = True
+
+
+class StatBucket(BaseModel):
+    key: Optional[str] = None  # tarif / promo (None si non renseigné)
+    registered: int
+    scanned: int
+    remaining: int
+
+
+class ArrivalBucket(BaseModel):
+    start: datetime  # début du créneau de 5 minutes
+    scanned: int
+
+
+class EventStatsOut(BaseModel):
+    event_id: int
+    registered: int
+    scanned: int
+    remaining: int
+    by_tarif: List[StatBucket]
+    by_promo: List[StatBucket]
+    arrivals: List[ArrivalBucket]
+
+
+class MailingOut(BaseModel):
+    id: int
+    event_id: int
+    status: str
+    force: bool
+    total: int
+    queued: int
+    sent: int
+    failed: int
+    skipped: int
+    created_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
@@ -0,0 +1,43 @@
+"""
+Sérialisation directe des lignes (tuples de colonnes) en JSON.
+
+Pour les grosses listes, on saute les objets ORM, la construction des modèles
+Pydantic et la re-validation du response_model : chaque ligne devient un dict
+dans l'ordre des champs du schéma, encodé d'un coup par le module json (même
+format que la JSONResponse de FastAPI). Le response_model reste déclaré sur
+les routes pour la documentation OpenAPI.
+"""
+import json
+from datetime import date, datetime
+from operator import itemgetter
+from typing import Any, Callable, Dict, Optional, Sequence, Type
+
+from pydantic import BaseModel
+
+Projector = Callable[[Sequence[Any]], Dict[str, Any]]
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()  # comme Pydantic pour les dates naïves
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def row_projector(columns: Sequence[str], schema: Optional[Type[BaseModel]] = None) -> Projector:
+    """Fonction ligne -> dict, avec les clés dans l'ordre des champs du schéma."""
+    keys = [name for name in schema.model_fields if name in columns] if schema else list(columns)
+    if len(keys) == 1:
+        index = list(columns).index(keys[0])
+        return lambda row: {keys[0]: row[index]}
+    getter = itemgetter(*(list(columns).index(key) for key in keys))
+    return lambda row: dict(zip(keys, getter(row)))
+
+
+def dumps(content: Any) -> bytes:
+    return json.dumps(
+        content,
+        default=_json_default,
+        ensure_ascii=False,
+        allow_nan=False,
+        separators=(",", ":"),
+    ).encode("utf-8")
@@ -0,0 +1,207 @@
+"""
+Statistiques d'un événement, précalculées dans la table event_stats.
+
+Une ligne par (événement, dimension, clé) : chaque tarif, chaque promo et
+chaque créneau d'arrivée de 5 minutes. Les écritures sur les participants et
+les scans ajoutent leur delta dans la même transaction (StatsDelta), si bien
+que GET /events/{id}/stats ne lit que quelques lignes, quelle que soit la
+taille de l'événement.
+
+Le total de l'événement n'a pas de ligne : c'est la somme des lignes "tarif"
+(chaque ticket est dans exactement une), faite à la lecture. Une ligne totale
+serait mise à jour par tous les scans de l'événement, qui attendraient chacun
+son verrou jusqu'au commit du précédent sous PostgreSQL (sous SQLite,
+l'écrivain est de toute façon unique). Un scan
+touche donc trois lignes : son tarif, sa promo et son créneau d'arrivée,
+partagées seulement avec les scans de même tarif, de même promo ou des mêmes
+5 minutes. Le tarif et la promo viennent du RETURNING du UPDATE qui scanne
+le ticket : le scan ne relit rien pour les compteurs.
+
+En cas de dérive (écriture faite hors de l'API, bug...), les compteurs se
+recalculent depuis les tickets :
+
+    python -m app.stats rebuild              # tous les événements
+    python -m app.stats rebuild --event 12
+"""
+import argparse
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from sqlalchemy import delete, select
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from app import models
+from app.db import session_scope, upsert_insert
+
+ARRIVAL_BUCKET_MINUTES = 5
+
+# taille des paquets (tickets relus pour un scan par lot, lignes par upsert)
+STATS_CHUNK_SIZE = 500
+
+StatKey = Tuple[int, str, str]  # (event_id, dimension, clé)
+Scan = Tuple[int, Optional[str], Optional[str], datetime]  # (event_id, tarif, promo, scanned_at)
+
+
+def arrival_bucket(scanned_at: datetime) -> str:
+    """Début du créneau de scanned_at, ex. "2026-01-24T18:05"."""
+    minute = scanned_at.minute - scanned_at.minute % ARRIVAL_BUCKET_MINUTES
+    return scanned_at.replace(minute=minute, second=0, microsecond=0).strftime("%Y-%m-%dT%H:%M")
+
+
+class StatsDelta:
+    """Variations à appliquer à event_stats, regroupées par ligne puis écrites en upsert."""
+
+    def __init__(self) -> None:
+        self._deltas: Dict[StatKey, List[int]] = defaultdict(lambda: [0, 0])  # -> [inscrits, scannés]
+
+    def _add(self, event_id: int, tarif: Optional[str], promo: Optional[str], registered: int, scanned: int) -> None:
+        for dimension, key in (("tarif", tarif or ""), ("promo", promo or "")):
+            delta = self._deltas[(event_id, dimension, key)]
+            delta[0] += registered
+            delta[1] += scanned
+
+    def register(
+        self,
+        event_id: int,
+        tarif: Optional[str],
+        promo: Optional[str],
+        scanned: bool = False,
+        scanned_at: Optional[datetime] = None,
+        count: int = 1,
+    ) -> None:
+        """count tickets ajoutés (count=-1 : retiré), déjà scannés ou non."""
+        self._add(event_id, tarif, promo, count, count if scanned else 0)
+        if scanned and scanned_at:
+            self._deltas[(event_id, "arrival", arrival_bucket(scanned_at))][1] += count
+
+    def scan(self, event_id: int, tarif: Optional[str], promo: Optional[str], scanned_at: datetime) -> None:
+        self._add(event_id, tarif, promo, 0, 1)
+        self._deltas[(event_id, "arrival", arrival_bucket(scanned_at))][1] += 1
+
+    def statements(self, db: Union[Session, Connection]) -> Iterator:
+        """INSERT ... ON CONFLICT DO UPDATE qui ajoutent les deltas, par paquets de lignes."""
+        rows = [
+            {"event_id": event_id, "dimension": dimension, "key": key, "registered": registered, "scanned": scanned}
+            for (event_id, dimension, key), (registered, scanned) in self._deltas.items()
+            if registered or scanned
+        ]
+        table = models.EventStat.__table__
+        for start in range(0, len(rows), STATS_CHUNK_SIZE):
+            insert = upsert_insert(db, table).values(rows[start:start + STATS_CHUNK_SIZE])
+            yield insert.on_conflict_do_update(
+                index_elements=[table.c.event_id, table.c.dimension, table.c.key],
+                set_={
+                    "registered": table.c.registered + insert.excluded.registered,
+                    "scanned": table.c.scanned + insert.excluded.scanned,
+                },
+            )
+
+    def apply(self, db: Union[Session, Connection]) -> None:
+        for statement in self.statements(db):
+            db.execute(statement)
+
+
+def _scans_delta(scans: Iterable[Scan]) -> StatsDelta:
+    delta = StatsDelta()
+    for event_id, tarif, promo, scanned_at in scans:
+        delta.scan(event_id, tarif, promo, scanned_at)
+    return delta
+
+
+def record_scans(db: Session, scans: Iterable[Scan]) -> None:
+    """Ajoute des scans (event_id, tarif, promo, scanned_at) aux compteurs, dans la transaction de db."""
+    _scans_delta(scans).apply(db)
+
+
+async def record_scans_async(db, scans: Iterable[Scan]) -> None:
+    """Version AsyncSession de record_scans."""
+    for statement in _scans_delta(scans).statements(db):
+        await db.execute(statement)
+
+
+def _stat_bucket(key: str, registered: int, scanned: int) -> dict:
+    return {"key": key or None, "registered": registered, "scanned": scanned, "remaining": registered - scanned}
+
+
+def get_event_stats(db: Session, event_id: int) -> dict:
+    stats = {
+        "event_id": event_id,
+        "registered": 0,
+        "scanned": 0,
+        "remaining": 0,
+        "by_tarif": [],
+        "by_promo": [],
+        "arrivals": [],
+    }
+    rows = db.execute(
+        select(
+            models.EventStat.dimension,
+            models.EventStat.key,
+            models.EventStat.registered,
+            models.EventStat.scanned,
+        )
+        .where(models.EventStat.event_id == event_id)
+        .order_by(models.EventStat.dimension, models.EventStat.key)
+    )
+    for dimension, key, registered, scanned in rows:
+        if dimension == "tarif":
+            # total = somme des tarifs, voir le docstring du module
+            stats["registered"] += registered
+            stats["scanned"] += scanned
+        if dimension == "arrival":
+            if scanned:
+                stats["arrivals"].append({"start": datetime.strptime(key, "%Y-%m-%dT%H:%M"), "scanned": scanned})
+        elif dimension in ("tarif", "promo") and (registered or scanned):
+            stats[f"by_{dimension}"].append(_stat_bucket(key, registered, scanned))
+    stats["remaining"] = stats["registered"] - stats["scanned"]
+    return stats
+
+
+def rebuild_event_stats(db: Union[Session, Connection], event_id: Optional[int] = None) -> int:
+    """Recalcule les compteurs depuis les tickets (tous les événements si event_id est None)."""
+    table = models.EventStat.__table__
+    tickets = (
+        select(
+            models.Ticket.event_id,
+            models.Participant.tarif,
+            models.Participant.promo,
+            models.Ticket.status,
+            models.Ticket.scanned_at,
+        )
+        .outerjoin(models.Participant, models.Participant.id == models.Ticket.participant_id)
+        .where(models.Ticket.event_id.is_not(None))
+    )
+    cleanup = delete(table)
+    if event_id is not None:
+        tickets = tickets.where(models.Ticket.event_id == event_id)
+        cleanup = cleanup.where(table.c.event_id == event_id)
+
+    delta = StatsDelta()
+    count = 0
+    for ticket_event_id, tarif, promo, status, scanned_at in db.execute(tickets):
+        delta.register(ticket_event_id, tarif, promo, status == "SCANNED", scanned_at)
+        count += 1
+    db.execute(cleanup)
+    delta.apply(db)
+    return count
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compteurs précalculés des événements.")
+    parser.add_argument("command", choices=("rebuild",))
+    parser.add_argument("--event", type=int, default=None, help="un seul événement")
+    args = parser.parse_args()
+
+    from app.migrations import run_migrations  # import local : migrations importe ce module
+
+    run_migrations()  # tickets.participant_id et event_stats doivent exister
+    with session_scope() as db:
+        count = rebuild_event_stats(db, args.event)
+        db.commit()
+    print(f"{count} ticket(s) recomptés")
+
+
+if __name__ == "__main__":
+    main()
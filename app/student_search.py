@@ -0,0 +1,251 @@
+"""
+Recherche d'élèves pour l'autocomplétion.
+
+Sous SQLite, deux tables FTS5 à contenu externe (= students, créées par
+app/migrations.py) sont tenues à jour par des triggers, donc aussi pour les
+imports en masse :
+
+- "students_fts" (tokenizer unicode61 avec remove_diacritics) : chaque mot
+  saisi est cherché en préfixe d'un mot du prénom ou du nom, sans tenir
+  compte des accents ("helene" trouve "Hélène") ;
+- "students_trgm" (tokenizer trigram) : la saisie entière cherchée n'importe
+  où dans le prénom, le nom ou l'email, comme les ILIKE '%q%' d'origine
+  ("art" trouve toujours "Martin").
+
+Seule différence avec les ILIKE : une saisie de 1 ou 2 caractères ne
+cherche que les débuts de mots ("ar" trouve "Arthur", pas "Martin") ; un
+trigramme a besoin de 3 caractères, et en dessous il faudrait relire toute
+la table.
+
+Les résultats sortent par groupes : noms de famille qui commencent par le
+premier mot saisi, puis préfixes de mots, puis sous-chaînes. Chaque groupe
+s'arrête aux premières lignes trouvées par l'index (LIMIT dans la requête
+FTS), sans trier toutes les correspondances : "m" sur 100k élèves ne lit
+que quelques lignes. Les élèves retenus sont triés par nom à l'intérieur
+de leur groupe. Sans FTS5 (autre base), on retombe sur les ILIKE d'origine.
+"""
+import re
+from typing import List, Set
+
+from sqlalchemy import or_, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from app import models
+
+FTS_TABLE = "students_fts"
+TRIGRAM_TABLE = "students_trgm"
+
+# noms et prénoms seulement : les emails sont cherchés par sous-chaîne (trigram)
+_FTS_SCHEMA = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        first_name, last_name,
+        content='students', content_rowid='id', prefix='1 2 3',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS students_fts_ai AFTER INSERT ON students BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, first_name, last_name)
+        VALUES (new.id, new.first_name, new.last_name);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS students_fts_ad AFTER DELETE ON students BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, first_name, last_name)
+        VALUES ('delete', old.id, old.first_name, old.last_name);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS students_fts_au AFTER UPDATE ON students BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, first_name, last_name)
+        VALUES ('delete', old.id, old.first_name, old.last_name);
+        INSERT INTO {FTS_TABLE}(rowid, first_name, last_name)
+        VALUES (new.id, new.first_name, new.last_name);
+    END
+    """,
+]
+
+# trigram : SQLite >= 3.34 ; insensible à la casse, pas aux accents (comme ILIKE) ;
+# sans lui, la recherche par sous-chaîne passe par ILIKE
+_TRIGRAM_SCHEMA = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {TRIGRAM_TABLE} USING fts5(
+        first_name, last_name, email,
+        content='students', content_rowid='id',
+        tokenize='trigram'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS students_trgm_ai AFTER INSERT ON students BEGIN
+        INSERT INTO {TRIGRAM_TABLE}(rowid, first_name, last_name, email)
+        VALUES (new.id, new.first_name, new.last_name, new.email);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS students_trgm_ad AFTER DELETE ON students BEGIN
+        INSERT INTO {TRIGRAM_TABLE}({TRIGRAM_TABLE}, rowid, first_name, last_name, email)
+        VALUES ('delete', old.id, old.first_name, old.last_name, old.email);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS students_trgm_au AFTER UPDATE ON students BEGIN
+        INSERT INTO {TRIGRAM_TABLE}({TRIGRAM_TABLE}, rowid, first_name, last_name, email)
+        VALUES ('delete', old.id, old.first_name, old.last_name, old.email);
+        INSERT INTO {TRIGRAM_TABLE}(rowid, first_name, last_name, email)
+        VALUES (new.id, new.first_name, new.last_name, new.email);
+    END
+    """,
+]
+
+# longueur minimale d'une recherche par sous-chaîne (celle d'un trigramme)
+TRIGRAM_MIN_LENGTH = 3
+
+_fts_enabled = False
+_trigram_enabled = False
+
+
+def _table_exists(conn: Connection, name: str) -> bool:
+    return conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+        {"name": name},
+    ).first() is not None
+
+
+def _install(conn: Connection, table: str, schema: List[str]) -> bool:
+    if conn.dialect.name != "sqlite":
+        return False
+
+    exists = _table_exists(conn, table)
+    try:
+        for statement in schema:
+            conn.execute(text(statement))
+    except OperationalError:
+        # SQLite compilé sans FTS5 (ou trop ancien pour trigram) : on garde ILIKE
+        return False
+    if not exists:
+        conn.execute(text(f"INSERT INTO {table}({table}) VALUES ('rebuild')"))
+    return True
+
+
+def install_search_index(conn: Connection) -> bool:
+    """Crée la table FTS et ses triggers (migration), et la remplit à la création."""
+    return _install(conn, FTS_TABLE, _FTS_SCHEMA)
+
+
+def install_trigram_index(conn: Connection) -> bool:
+    """
+    Même chose pour la table trigram (recherche de sous-chaînes). Une table
+    students_fts créée avant elle indexe encore les emails, dont les mots très
+    fréquents ("eleves", "enpc") ralentissent les recherches : on la recrée.
+    """
+    if not _install(conn, TRIGRAM_TABLE, _TRIGRAM_SCHEMA):
+        return False
+    columns = {row[1] for row in conn.execute(text(f"PRAGMA table_info({FTS_TABLE})"))}
+    if "email" in columns:
+        for trigger in ("students_fts_ai", "students_fts_ad", "students_fts_au"):
+            conn.execute(text(f"DROP TRIGGER IF EXISTS {trigger}"))
+        conn.execute(text(f"DROP TABLE {FTS_TABLE}"))
+        install_search_index(conn)
+    return True
+
+
+def detect_search_index(engine: Engine) -> None:
+    """Active la recherche FTS si la migration a pu créer les tables."""
+    global _fts_enabled, _trigram_enabled
+    if engine.dialect.name != "sqlite":
+        _fts_enabled = _trigram_enabled = False
+        return
+    with engine.connect() as conn:
+        _fts_enabled = _table_exists(conn, FTS_TABLE)
+        _trigram_enabled = _table_exists(conn, TRIGRAM_TABLE)
+
+
+def _match_expression(terms: List[str], column: str = "", anchored: bool = False) -> str:
+    # termes réduits à \w+ : pas de guillemets ni d'opérateurs FTS à échapper
+    # anchored : le premier terme doit être le premier mot de la colonne (^ de FTS5)
+    prefix = f"{column} : " if column else ""
+    return " AND ".join(
+        f'{prefix}{"^" if anchored and position == 0 else ""}"{term}"*' for position, term in enumerate(terms)
+    )
+
+
+def _search_like(db: Session, q: str, limit: int) -> List[models.Student]:
+    like = f"%{q}%"
+    return (
+        db.query(models.Student)
+        .filter(
+            or_(
+                models.Student.first_name.ilike(like),
+                models.Student.last_name.ilike(like),
+                models.Student.email.ilike(like),
+            )
+        )
+        .order_by(models.Student.last_name)
+        .limit(limit)
+        .all()
+    )
+
+
+def _fts_ids(db: Session, table: str, match: str, limit: int, exclude: Set[int]) -> List[int]:
+    # LIMIT dans la requête FTS : les premières lignes trouvées, pas de tri de toutes les correspondances
+    rows = db.execute(
+        text(f"SELECT rowid FROM {table} WHERE {table} MATCH :match LIMIT :limit"),
+        {"match": match, "limit": limit + len(exclude)},
+    )
+    return [student_id for (student_id,) in rows if student_id not in exclude][:limit]
+
+
+def _substring_ids(db: Session, q: str, limit: int, exclude: Set[int]) -> List[int]:
+    """Élèves dont le prénom, le nom ou l'email contient q, comme les ILIKE d'origine."""
+    if len(q) < TRIGRAM_MIN_LENGTH:
+        return []
+    if _trigram_enabled:
+        return _fts_ids(db, TRIGRAM_TABLE, '"' + q.replace('"', '""') + '"', limit, exclude)
+
+    like = f"%{q}%"
+    rows = (
+        db.query(models.Student.id)
+        .filter(
+            or_(
+                models.Student.first_name.ilike(like),
+                models.Student.last_name.ilike(like),
+                models.Student.email.ilike(like),
+            )
+        )
+        .limit(limit + len(exclude))
+    )
+    return [student_id for (student_id,) in rows if student_id not in exclude][:limit]
+
+
+def search_students(db: Session, q: str, limit: int = 8) -> List[models.Student]:
+    terms = re.findall(r"\w+", q)
+    if not _fts_enabled or not terms:
+        return _search_like(db, q, limit)
+
+    groups: List[List[int]] = []
+    found: Set[int] = set()
+
+    def add(ids: List[int]) -> None:
+        groups.append(ids)
+        found.update(ids)
+
+    # 1. noms de famille qui commencent par le premier mot saisi ("martin" : MARTIN,
+    #    MARTINEZ, mais pas SAINT-MARTIN, qui vient ensuite avec les autres)
+    add(_fts_ids(db, FTS_TABLE, _match_expression(terms[:1], "last_name", anchored=True) + (
+        " AND " + _match_expression(terms[1:]) if len(terms) > 1 else ""
+    ), limit, found))
+    # 2. chaque mot saisi en préfixe d'un mot, sans accents
+    if len(found) < limit:
+        add(_fts_ids(db, FTS_TABLE, _match_expression(terms), limit - len(found), found))
+    # 3. la saisie n'importe où (sous-chaîne, 3 caractères au moins)
+    if len(found) < limit:
+        add(_substring_ids(db, q, limit - len(found), found))
+
+    students = {student.id: student for student in db.query(models.Student).filter(models.Student.id.in_(found))}
+    results: List[models.Student] = []
+    for ids in groups:
+        results.extend(sorted((students[i] for i in ids), key=lambda s: (s.last_name, s.first_name, s.id)))
+    return results
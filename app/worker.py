@@ -0,0 +1,37 @@
+"""
+Worker de la file de tâches, à lancer à côté de l'API :
+
+    python -m app.worker [--concurrency 4] [--batch-size 20] [--once]
+
+Sans lui, les mails restent dans la file : l'API ne les envoie pas elle-même
+(sauf JOBS_EMBEDDED_WORKER=1, pratique en développement).
+"""
+import argparse
+import logging
+import os
+
+from app import jobs
+from app import mailing  # noqa: F401  (enregistre les tâches d'envoi de mails)
+
+EMAIL_WORKERS = int(os.getenv("EMAIL_WORKERS", "4"))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Exécute les tâches de la table jobs.")
+    parser.add_argument("--concurrency", type=int, default=EMAIL_WORKERS)
+    parser.add_argument("--batch-size", type=int, default=20)
+    parser.add_argument("--poll-interval", type=float, default=1.0)
+    parser.add_argument("--once", action="store_true", help="s'arrête quand la file est vide")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    jobs.run_worker(
+        concurrency=args.concurrency,
+        batch_size=args.batch_size,
+        poll_interval=args.poll_interval,
+        once=args.once,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Même charge que bench/sqlite_load.py (scans + listes de participants), mais
+à travers un vrai serveur uvicorn et beaucoup de clients simultanés, pour
+comparer les routes synchrones (threadpool) et la version ASYNC_DB=1.
+
+Chaque mode tourne sur une base neuve dans un dossier temporaire ; il faut
+httpx côté client et aiosqlite pour ASYNC_DB=1.
+
+    python -m bench.async_load --clients 500 --duration 10
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+from bench.sqlite_load import REPO_ROOT, _percentile, _seed
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _wait_until_up(client, base_url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            await client.get(f"{base_url}/docs")
+            return
+        except Exception:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.2)
+
+
+async def _load(args: argparse.Namespace, base_url: str, event_id: int) -> Dict:
+    import httpx
+
+    limits = httpx.Limits(max_connections=args.clients, max_keepalive_connections=args.clients)
+    async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+        await _wait_until_up(client, base_url)
+        login = await client.post(
+            f"{base_url}/auth/login",
+            data={
+                "username": os.getenv("SUPERADMIN_EMAIL", "admin@tdlog.local"),
+                "password": os.getenv("SUPERADMIN_PASSWORD", "changeme"),
+            },
+        )
+        headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+        tokens = iter(range(args.participants))
+        latencies: Dict[str, List[float]] = {"scan": [], "list": []}
+        errors: Dict[str, int] = {"scan": 0, "list": 0}
+        deadline = time.monotonic() + args.duration
+
+        async def worker(position: int) -> None:
+            # un client sur `readers_every` liste les participants, les autres scannent
+            kind = "list" if position % args.readers_every == 0 else "scan"
+            while time.monotonic() < deadline:
+                started = time.perf_counter()
+                try:
+                    if kind == "scan":
+                        token = next(tokens, None)
+                        if token is None:
+                            return
+                        response = await client.post(
+                            f"{base_url}/scan/", json={"token": f"tok-{token}", "event_id": event_id}
+                        )
+                        ok = response.status_code == 200 and response.json()["valid"]
+                    else:
+                        response = await client.get(
+                            f"{base_url}/events/{event_id}/participants/", params={"limit": 200}, headers=headers
+                        )
+                        ok = response.status_code == 200
+                except httpx.HTTPError:
+                    ok = False
+                latencies[kind].append((time.perf_counter() - started) * 1000)
+                if not ok:
+                    errors[kind] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(position) for position in range(args.clients)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        kind: {
+            "requests": len(values),
+            "per_second": round(len(values) / elapsed, 1),
+            "errors": errors[kind],
+            "p50_ms": round(_percentile(values, 0.50), 1),
+            "p95_ms": round(_percentile(values, 0.95), 1),
+            "p99_ms": round(_percentile(values, 0.99), 1),
+        }
+        for kind, values in latencies.items()
+    }
+
+
+def _run_mode(args: argparse.Namespace, env: Dict[str, str], workdir: str) -> Dict:
+    seed = [sys.executable, "-m", "bench.async_load", "--seed", f"--participants={args.participants}"]
+    output = subprocess.run(seed, cwd=workdir, env=env, check=True, capture_output=True, text=True)
+    event_id = int(output.stdout.strip().splitlines()[-1])
+
+    port = _free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=workdir,
+        env=env,
+    )
+    try:
+        return asyncio.run(_load(args, f"http://127.0.0.1:{port}", event_id))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", default="0,1", help="valeurs de ASYNC_DB à comparer")
+    parser.add_argument("--participants", type=int, default=50000)
+    parser.add_argument("--clients", type=int, default=500)
+    parser.add_argument("--readers-every", type=int, default=10, help="un client sur N fait des listes")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--seed", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.seed:
+        from app.migrations import run_migrations
+
+        run_migrations()
+        print(_seed(args.participants))
+        return
+
+    results = {}
+    for mode in args.modes.split(","):
+        with tempfile.TemporaryDirectory() as workdir:
+            env = dict(
+                os.environ,
+                ASYNC_DB=mode,
+                JOBS_EMBEDDED_WORKER="0",
+                QR_CACHE_DIR=os.path.join(workdir, "qr_cache"),
+                PYTHONPATH=REPO_ROOT,
+            )
+            results[f"ASYNC_DB={mode}"] = _run_mode(args, env, workdir)
+
+    for mode, result in results.items():
+        for kind, stats in result.items():
+            print(
+                f"{mode:10} {kind:5} {stats['per_second']:8.1f} req/s  erreurs {stats['errors']:5}"
+                f"  p50 {stats['p50_ms']:7.1f} ms  p95 {stats['p95_ms']:7.1f} ms  p99 {stats['p99_ms']:7.1f} ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Sérialisation de la liste des participants d'un gros événement : ancien chemin
+(objets ORM + _participant_to_out + validation/dump du response_model, comme le
+fait FastAPI) contre le chemin direct tuples -> JSON de app.serializers.
+
+Base SQLite en mémoire, app.db n'est pas touchée.
+
+    python -m bench.serializers --participants 5000 --repeat 20
+"""
+import argparse
+import json
+import statistics
+import time
+from typing import Callable, Dict, List
+
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import sessionmaker
+
+from app import models, schemas
+from app.db import Base
+from app.routers.participants import _participant_to_out
+from app.serializers import dumps, row_projector
+
+
+def _seed(db, count: int) -> None:
+    db.execute(insert(models.Event.__table__), [{"id": 1, "name": "Gala", "location": "ENPC"}])
+    db.execute(
+        insert(models.Participant.__table__),
+        [
+            {
+                "event_id": 1,
+                "first_name": f"Prénom{i}",
+                "last_name": f"NOM{i % 997}",
+                "promo": "2026",
+                "email": f"p{i}@eleves.enpc.fr",
+                "tarif": "cotisant",
+                "qr_code": f"token-{i}",
+            }
+            for i in range(count)
+        ],
+    )
+    db.execute(
+        insert(models.Ticket.__table__),
+        [
+            {
+                "event_id": 1,
+                "user_email": f"p{i}@eleves.enpc.fr",
+                "user_name": f"Prénom{i} NOM{i % 997}",
+                "qr_code_token": f"token-{i}",
+                "status": "SCANNED" if i % 3 == 0 else "UNUSED",
+            }
+            for i in range(count)
+        ],
+    )
+    db.commit()
+
+
+_response_adapter = TypeAdapter(List[schemas.ParticipantOut])
+
+
+def orm_path(db) -> bytes:
+    participants = (
+        db.query(models.Participant)
+        .filter(models.Participant.event_id == 1)
+        .order_by(models.Participant.last_name, models.Participant.id)
+        .all()
+    )
+    tickets = (
+        db.query(models.Ticket)
+        .filter(models.Ticket.qr_code_token.in_([p.qr_code for p in participants]))
+        .all()
+    )
+    tickets_by_qr: Dict[str, models.Ticket] = {t.qr_code_token: t for t in tickets}
+    content = [_participant_to_out(p, tickets_by_qr.get(p.qr_code)) for p in participants]
+    # ce que fait FastAPI avec response_model : validation, dump, puis JSONResponse
+    validated = _response_adapter.validate_python(content, from_attributes=True)
+    payload = _response_adapter.dump_python(validated, mode="json")
+    body = json.dumps(payload, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+    db.expunge_all()
+    return body
+
+
+def tuple_path(db) -> bytes:
+    result = db.execute(
+        select(
+            models.Participant.id,
+            models.Participant.event_id,
+            models.Participant.first_name,
+            models.Participant.last_name,
+            models.Participant.promo,
+            models.Participant.email,
+            models.Participant.tarif,
+            models.Participant.qr_code,
+            models.Ticket.status,
+            models.Ticket.scanned_at,
+        )
+        .outerjoin(models.Ticket, models.Ticket.qr_code_token == models.Participant.qr_code)
+        .where(models.Participant.event_id == 1)
+        .order_by(models.Participant.last_name, models.Participant.id)
+    )
+    project = row_projector(list(result.keys()), schemas.ParticipantOut)
+    return dumps([project(row) for row in result])
+
+
+def _measure(func: Callable, db, repeat: int) -> List[float]:
+    func(db)  # échauffement
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(db)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--participants", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    _seed(db, args.participants)
+
+    # même contenu, même ordre des champs
+    assert orm_path(db) == tuple_path(db), "les deux chemins ne produisent pas le même JSON"
+
+    results = {}
+    for name, func in (("orm + pydantic", orm_path), ("tuples -> json", tuple_path)):
+        timings = _measure(func, db, args.repeat)
+        results[name] = statistics.median(timings)
+        print(f"{name:16} médiane {results[name]:7.1f} ms   min {min(timings):7.1f} ms")
+    print(f"gain x{results['orm + pydantic'] / results['tuples -> json']:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Débit d'envoi des mails QR : une connexion SMTP par mail (ancien comportement)
+contre le pool de connexions de app.email_utils.
+
+Un faux serveur SMTP local (sans TLS) reçoit les messages ; --connect-delay
+simule le coût du handshake TLS + login d'un vrai fournisseur.
+
+    python -m bench.smtp_pool --messages 200 --connect-delay 0.05
+"""
+import argparse
+import smtplib
+import socketserver
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from app import models
+from app.email_utils import EmailSettings, SMTPConnectionPool, build_participant_qr_message
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    """Juste assez de SMTP pour smtplib : EHLO, AUTH PLAIN, MAIL, RCPT, DATA, QUIT."""
+
+    connect_delay = 0.0
+
+    def _reply(self, line: str) -> None:
+        self.wfile.write(line.encode("ascii") + b"\r\n")
+
+    def handle(self) -> None:
+        time.sleep(self.connect_delay)
+        self._reply("220 localhost bench SMTP")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode("ascii", "replace").strip().upper()
+            if command.startswith(("EHLO", "HELO")):
+                self._reply("250-localhost")
+                self._reply("250 AUTH PLAIN LOGIN")
+            elif command.startswith("AUTH"):
+                self._reply("235 ok")
+            elif command == "DATA":
+                self._reply("354 go ahead")
+                while self.rfile.readline() not in (b".\r\n", b""):
+                    pass
+                self._reply("250 queued")
+            elif command == "QUIT":
+                self._reply("221 bye")
+                return
+            else:
+                self._reply("250 ok")
+
+
+class _ThreadingSMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def _settings(port: int, max_connections: int) -> EmailSettings:
+    return EmailSettings(
+        host="127.0.0.1",
+        port=port,
+        username="bench",
+        password="bench",
+        from_email="bench@localhost",
+        from_name="Bench",
+        use_tls=False,
+        max_connections=max_connections,
+    )
+
+
+def _fake_recipients(count: int):
+    event = models.Event(id=1, name="Bench", date=datetime(2026, 1, 1, 20, 0), location="Ruche")
+    participants = [
+        models.Participant(id=i, first_name="Camille", last_name=f"Bench{i}", email=f"p{i}@localhost")
+        for i in range(count)
+    ]
+    return event, participants
+
+
+def _send_one_connection_per_mail(settings: EmailSettings, msg) -> None:
+    # ce que faisait send_participant_qr_email avant le pool
+    with smtplib.SMTP(settings.host, settings.port) as server:
+        server.login(settings.username, settings.password)
+        server.send_message(msg)
+
+
+def run(messages: int, workers: int, connect_delay: float) -> dict:
+    _SMTPHandler.connect_delay = connect_delay
+    server = _ThreadingSMTPServer(("127.0.0.1", 0), _SMTPHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    settings = _settings(server.server_address[1], workers)
+
+    # messages construits à l'avance : on ne mesure que le transport
+    event, participants = _fake_recipients(messages)
+    built = [
+        build_participant_qr_message(settings, event, participant, f"token-{participant.id}")
+        for participant in participants
+    ]
+
+    results = {}
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(lambda m: _send_one_connection_per_mail(settings, m), built))
+    results["one_connection_per_mail"] = messages / (time.perf_counter() - start)
+
+    pool = SMTPConnectionPool(settings)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(pool.send_message, built))
+    results["pooled"] = messages / (time.perf_counter() - start)
+    pool.close()
+
+    server.shutdown()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=2, help="envois / connexions simultanés")
+    parser.add_argument("--connect-delay", type=float, default=0.05, help="secondes par nouvelle connexion")
+    args = parser.parse_args()
+
+    results = run(args.messages, args.workers, args.connect_delay)
+    for name, rate in results.items():
+        print(f"{name:>24}: {rate:8.1f} messages/s")
+
+
+if __name__ == "__main__":
+    main()
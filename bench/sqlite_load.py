@@ -0,0 +1,173 @@
+"""
+Charge mixte "ouverture des portes" : des scanners qui valident des tickets
+(POST /scan/, écritures) pendant que des tableaux de bord listent les
+participants (GET .../participants/, lectures).
+
+Chaque profil de stockage (DB_PROFILE de app/db.py) tourne dans un processus
+à part, sur une base neuve dans un dossier temporaire ; app.db n'est pas touchée.
+
+    python -m bench.sqlite_load --scanners 8 --readers 4 --duration 10
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from queue import Empty, Queue
+from typing import Dict, List
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def _seed(participants: int) -> int:
+    from sqlalchemy import insert
+
+    from app import models
+    from app.db import session_scope
+
+    with session_scope() as db:
+        event = models.Event(name="Gala", location="ENPC")
+        db.add(event)
+        db.flush()
+        db.execute(
+            insert(models.Participant.__table__),
+            [
+                {"event_id": event.id, "first_name": f"P{i}", "last_name": f"NOM{i}", "qr_code": f"tok-{i}"}
+                for i in range(participants)
+            ],
+        )
+        db.execute(
+            insert(models.Ticket.__table__),
+            [
+                {"event_id": event.id, "user_name": f"P{i} NOM{i}", "qr_code_token": f"tok-{i}", "status": "UNUSED"}
+                for i in range(participants)
+            ],
+        )
+        db.commit()
+        return event.id
+
+
+def _run_profile(args: argparse.Namespace) -> Dict:
+    """Exécuté dans le sous-processus, dossier courant = base temporaire."""
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    event_id = _seed(args.participants)
+    with TestClient(app) as client:
+        login = client.post(
+            "/auth/login",
+            data={
+                "username": os.getenv("SUPERADMIN_EMAIL", "admin@tdlog.local"),
+                "password": os.getenv("SUPERADMIN_PASSWORD", "changeme"),
+            },
+        )
+        headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+    tokens: Queue = Queue()
+    for i in range(args.participants):
+        tokens.put(f"tok-{i}")
+
+    stop = threading.Event()
+    lock = threading.Lock()
+    latencies: Dict[str, List[float]] = {"scan": [], "list": []}
+    errors: Dict[str, int] = {"scan": 0, "list": 0}
+
+    def record(kind: str, started: float, ok: bool) -> None:
+        with lock:
+            latencies[kind].append((time.perf_counter() - started) * 1000)
+            if not ok:
+                errors[kind] += 1
+
+    def scanner() -> None:
+        client = TestClient(app, raise_server_exceptions=False)
+        while not stop.is_set():
+            try:
+                token = tokens.get_nowait()
+            except Empty:
+                return
+            started = time.perf_counter()
+            response = client.post("/scan/", json={"token": token, "event_id": event_id})
+            record("scan", started, response.status_code == 200 and response.json()["valid"])
+
+    def reader() -> None:
+        client = TestClient(app, raise_server_exceptions=False)
+        while not stop.is_set():
+            started = time.perf_counter()
+            response = client.get(f"/events/{event_id}/participants/", params={"limit": 200}, headers=headers)
+            record("list", started, response.status_code == 200)
+
+    threads = [threading.Thread(target=scanner) for _ in range(args.scanners)]
+    threads += [threading.Thread(target=reader) for _ in range(args.readers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    return {
+        kind: {
+            "requests": len(values),
+            "per_second": round(len(values) / elapsed, 1),
+            "errors": errors[kind],
+            "p50_ms": round(_percentile(values, 0.50), 1),
+            "p95_ms": round(_percentile(values, 0.95), 1),
+            "p99_ms": round(_percentile(values, 0.99), 1),
+        }
+        for kind, values in latencies.items()
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profiles", default="legacy,wal", help="profils DB_PROFILE à comparer")
+    parser.add_argument("--participants", type=int, default=20000)
+    parser.add_argument("--scanners", type=int, default=8)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--run", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        print(json.dumps(_run_profile(args)))
+        return
+
+    results = {}
+    for profile in args.profiles.split(","):
+        with tempfile.TemporaryDirectory() as workdir:
+            env = dict(
+                os.environ,
+                DB_PROFILE=profile,
+                JOBS_EMBEDDED_WORKER="0",
+                QR_CACHE_DIR=os.path.join(workdir, "qr_cache"),
+                PYTHONPATH=REPO_ROOT,
+            )
+            command = [sys.executable, "-m", "bench.sqlite_load", "--run"] + [
+                f"--{name}={getattr(args, name)}" for name in ("participants", "scanners", "readers", "duration")
+            ]
+            output = subprocess.run(command, cwd=workdir, env=env, check=True, capture_output=True, text=True)
+            results[profile] = json.loads(output.stdout.strip().splitlines()[-1])
+
+    for profile, result in results.items():
+        for kind, stats in result.items():
+            print(
+                f"{profile:7} {kind:5} {stats['per_second']:8.1f} req/s  erreurs {stats['errors']:5}"
+                f"  p50 {stats['p50_ms']:7.1f} ms  p95 {stats['p95_ms']:7.1f} ms  p99 {stats['p99_ms']:7.1f} ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,329 @@
+"""
+Suite de benchmarks des routes chaudes de l'API, reproductible d'un commit à l'autre.
+
+Chaque exécution part d'une base neuve dans un dossier temporaire (données
+générées par app.datagen avec une graine fixe ; app.db n'est pas touchée) et
+attaque la vraie application app.main:app, soit en processus (TestClient),
+soit à travers un serveur uvicorn local. Tout tourne hors ligne, sur une
+seule machine.
+
+Scénarios : login, /auth/me, scan (token neuf, déjà scanné, inconnu), liste
+des participants d'un événement de 100 / 1 000 / 10 000 personnes, recherche
+d'élèves, import CSV d'élèves. Pour chacun : débit et latences p50/p95/p99,
+écrits en JSON pour comparer deux exécutions.
+
+    python -m bench                                     # = python -m bench.suite
+    python -m bench --transport uvicorn --concurrency 8
+    python -m bench --only scan_unique,participants_10k --scale 0.2
+    python -m bench --compare bench_results/avant.json
+    python -m bench --students 100000                   # annuaire de taille réelle
+"""
+import argparse
+import io
+import itertools
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from bench.async_load import _free_port
+from bench.sqlite_load import REPO_ROOT, _percentile
+
+BENCH_EMAIL = "bench@example.com"
+BENCH_PASSWORD = "bench-password"
+LIST_SIZES = {"100": 100, "1k": 1000, "10k": 10000}
+CSV_ROWS = 500
+
+# nombre de requêtes par scénario pour --scale 1
+SCENARIOS: Dict[str, int] = {
+    "login": 50,
+    "auth_me": 1000,
+    "scan_unique": 1000,
+    "scan_duplicate": 1000,
+    "scan_unknown": 1000,
+    "participants_100": 300,
+    "participants_1k": 100,
+    "participants_10k": 20,
+    "student_search": 1000,
+    "csv_import": 10,
+}
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        output = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.stdout.strip() or None
+
+
+def _seed(seed: int, students: int) -> Dict:
+    """Événements de 100 / 1k / 10k participants et annuaire (app.datagen) ; renvoie ce que les scénarios utilisent."""
+    from sqlalchemy import select
+
+    from app import models
+    from app.datagen import generate_event, generate_students
+    from app.db import session_scope
+    from app.stats import rebuild_event_stats
+
+    rng = random.Random(seed)
+    data: Dict = {"events": {}}
+    with session_scope() as db:
+        generate_students(db, rng, students)
+        for label, size in LIST_SIZES.items():
+            # un quart déjà scanné (doublons), le reste neuf
+            event = generate_event(db, rng, size, [], scanned_ratio=0.25, canceled_ratio=0.0, name=f"Bench {label}")
+            data["events"][label] = event.id
+        rebuild_event_stats(db)
+        db.commit()
+
+        # le plus gros événement sert aux scans
+        tickets = db.execute(
+            select(models.Ticket.qr_code_token, models.Ticket.status)
+            .where(models.Ticket.event_id == data["events"]["10k"])
+            .order_by(models.Ticket.id)
+        ).all()
+        data["fresh_tokens"] = [token for token, status in tickets if status == "UNUSED"]
+        data["scanned_tokens"] = [token for token, status in tickets if status == "SCANNED"]
+        last_names = db.execute(select(models.Student.last_name).order_by(models.Student.id).limit(200)).scalars()
+        data["search_terms"] = [last_name[: rng.randint(1, 4)].lower() for last_name in last_names]
+    return data
+
+
+def _csv_file(batch: int) -> bytes:
+    rows = ["first_name;last_name;email"]
+    rows += [f"Prenom{i};NOM{i};import{batch}-{i}@eleves.enpc.fr" for i in range(CSV_ROWS)]
+    return "\n".join(rows).encode("utf-8")
+
+
+def _scenarios(data: Dict) -> Dict[str, Callable]:
+    """nom -> fonction(client, headers, i) qui fait une requête et renvoie True si la réponse est la bonne."""
+    fresh = iter(data["fresh_tokens"])
+    fresh_lock = threading.Lock()
+
+    def next_fresh() -> str:
+        with fresh_lock:
+            return next(fresh)
+
+    def scan(client, token: str, expected: Optional[str]) -> bool:
+        response = client.post("/scan/", json={"token": token})
+        return response.status_code == 200 and response.json()["reason"] == expected
+
+    def participants(label: str) -> Callable:
+        def run(client, headers, i) -> bool:
+            response = client.get(f"/events/{data['events'][label]}/participants/", headers=headers)
+            return response.status_code == 200 and len(response.json()) == LIST_SIZES[label]
+
+        return run
+
+    return {
+        "login": lambda client, headers, i: client.post(
+            "/auth/login", data={"username": BENCH_EMAIL, "password": BENCH_PASSWORD}
+        ).status_code == 200,
+        "auth_me": lambda client, headers, i: client.get("/auth/me", headers=headers).status_code == 200,
+        "scan_unique": lambda client, headers, i: scan(client, next_fresh(), None),
+        "scan_duplicate": lambda client, headers, i: scan(
+            client, data["scanned_tokens"][i % len(data["scanned_tokens"])], "already_scanned"
+        ),
+        "scan_unknown": lambda client, headers, i: scan(client, f"inconnu-{i}", "ticket_not_found"),
+        **{f"participants_{label}": participants(label) for label in LIST_SIZES},
+        "student_search": lambda client, headers, i: client.get(
+            "/students/search", params={"q": data["search_terms"][i % len(data["search_terms"])]}
+        ).status_code == 200,
+        "csv_import": lambda client, headers, i: client.post(
+            "/students/import-csv", files={"file": ("eleves.csv", io.BytesIO(_csv_file(i)), "text/csv")}
+        ).json().get("inserted") == CSV_ROWS,
+    }
+
+
+def _measure(make_client: Callable, run: Callable, headers: Dict, requests: int, concurrency: int) -> Dict:
+    latencies: List[float] = []
+    errors = [0]
+    lock = threading.Lock()
+    counter = itertools.count()
+
+    def worker() -> None:
+        client = make_client()
+        while True:
+            i = next(counter)
+            if i >= requests:
+                return
+            started = time.perf_counter()
+            try:
+                ok = run(client, headers, i)
+            except Exception:
+                ok = False
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                latencies.append(elapsed)
+                errors[0] += not ok
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    return {
+        "requests": len(latencies),
+        "errors": errors[0],
+        "per_second": round(len(latencies) / elapsed, 1),
+        "mean_ms": round(sum(latencies) / len(latencies), 2) if latencies else 0.0,
+        "p50_ms": round(_percentile(latencies, 0.50), 2),
+        "p95_ms": round(_percentile(latencies, 0.95), 2),
+        "p99_ms": round(_percentile(latencies, 0.99), 2),
+    }
+
+
+def _run(args: argparse.Namespace) -> Dict:
+    """Exécuté dans le sous-processus, dossier courant = base temporaire."""
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    data = _seed(args.seed, args.students)
+    server = None
+    if args.transport == "uvicorn":
+        import httpx
+
+        port = _free_port()
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"]
+        )
+        base_url = f"http://127.0.0.1:{port}"
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                httpx.get(f"{base_url}/health")
+                break
+            except httpx.HTTPError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.2)
+
+        def make_client():
+            return httpx.Client(base_url=base_url, timeout=120)
+    else:
+        def make_client():
+            return TestClient(app)
+
+    try:
+        client = make_client()
+        token = client.post("/auth/login", data={"username": BENCH_EMAIL, "password": BENCH_PASSWORD}).json()
+        headers = {"Authorization": f"Bearer {token['access_token']}"}
+        scenarios = _scenarios(data)
+        selected = args.only.split(",") if args.only else list(SCENARIOS)
+
+        results = {}
+        for name in selected:
+            requests = max(1, int(SCENARIOS[name] * args.scale))
+            if name == "scan_unique":
+                requests = min(requests, len(data["fresh_tokens"]))
+            # tour de chauffe hors mesure (caches, imports paresseux), sauf pour les scénarios qui consomment
+            if name not in ("scan_unique", "csv_import"):
+                for i in range(min(10, requests)):
+                    scenarios[name](client, headers, i)
+            results[name] = _measure(make_client, scenarios[name], headers, requests, args.concurrency)
+            print(f"  {name} ok", file=sys.stderr)
+        return results
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+
+def _print_results(results: Dict, baseline: Optional[Dict], baseline_label: str = "") -> None:
+    for name, stats in results["scenarios"].items():
+        line = (
+            f"{name:18} {stats['per_second']:9.1f} req/s  erreurs {stats['errors']:4}"
+            f"  p50 {stats['p50_ms']:8.2f} ms  p95 {stats['p95_ms']:8.2f} ms  p99 {stats['p99_ms']:8.2f} ms"
+        )
+        previous = (baseline or {}).get("scenarios", {}).get(name)
+        if previous and previous["p50_ms"]:
+            line += f"   p50 x{stats['p50_ms'] / previous['p50_ms']:.2f} vs {baseline_label}"
+        print(line)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--transport", choices=("inprocess", "uvicorn"), default="inprocess")
+    parser.add_argument("--concurrency", type=int, default=1, help="clients simultanés")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplie le nombre de requêtes par scénario")
+    parser.add_argument("--only", default="", help=f"scénarios séparés par des virgules, parmi : {','.join(SCENARIOS)}")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--students", type=int, default=5000, help="taille de l'annuaire (100000 : taille réelle)")
+    parser.add_argument("--output", default=None, help="fichier JSON (défaut : bench_results/<date>-<commit>.json)")
+    parser.add_argument("--compare", default=None, help="résultats JSON d'une exécution précédente")
+    parser.add_argument("--run", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        print(json.dumps(_run(args)))
+        return
+
+    unknown = set(filter(None, args.only.split(","))) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"scénarios inconnus : {', '.join(sorted(unknown))}")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        env = dict(
+            os.environ,
+            JOBS_EMBEDDED_WORKER="0",
+            QR_CACHE_DIR=os.path.join(workdir, "qr_cache"),
+            SUPERADMIN_EMAIL=BENCH_EMAIL,
+            SUPERADMIN_PASSWORD=BENCH_PASSWORD,
+            PYTHONPATH=REPO_ROOT,
+        )
+        env.pop("DATABASE_URL", None)  # toujours la base neuve du dossier temporaire
+        env.pop("DATABASE_READ_URL", None)
+        command = [sys.executable, "-m", "bench.suite", "--run"] + [
+            f"--{name}={getattr(args, name)}" for name in ("transport", "concurrency", "scale", "only", "seed", "students")
+        ]
+        output = subprocess.run(command, cwd=workdir, env=env, check=True, stdout=subprocess.PIPE, text=True)
+        scenarios = json.loads(output.stdout.strip().splitlines()[-1])
+
+    commit = _git_commit()
+    results = {
+        "meta": {
+            "commit": commit,
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "db_profile": os.getenv("DB_PROFILE", "wal"),
+            "async_db": os.getenv("ASYNC_DB", "0"),
+            "args": {name: getattr(args, name) for name in ("transport", "concurrency", "scale", "only", "seed", "students")},
+        },
+        "scenarios": scenarios,
+    }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            baseline = json.load(file)
+    _print_results(results, baseline, (baseline or {}).get("meta", {}).get("commit") or args.compare or "")
+
+    path = args.output or os.path.join(
+        "bench_results", f"{datetime.now():%Y%m%d-%H%M%S}-{commit or 'nogit'}.json"
+    )
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(results, file, indent=2)
+    print(f"résultats : {path}")
+
+
+if __name__ == "__main__":
+    main()